@@ -0,0 +1,91 @@
+"""
+Latency of an authenticated endpoint under concurrent load.
+
+Runs `--clients` concurrent clients against a running instance, each
+sending requests back to back until `--requests` have completed in total,
+and prints throughput and latency percentiles:
+
+    python benchmarks/auth_load.py --url http://127.0.0.1:8000 \\
+        --username root@example.com --password secret --clients 200
+
+Compare the output of the same run before and after a change to the
+authentication path; restart the server between runs so both start cold.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    r = await client.post("/api/v1/users/login", json={"username": username, "password": password})
+    r.raise_for_status()
+    return r.json()["token"]
+
+
+async def worker(client, path, headers, queue, latencies, errors):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        try:
+            r = await client.post(path, headers=headers)
+            if r.status_code >= 400:
+                errors.append(r.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        token = args.token or await login(client, args.username, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        queue = asyncio.Queue()
+        for _ in range(args.requests):
+            queue.put_nowait(None)
+        latencies, errors = [], []
+
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            worker(client, args.path, headers, queue, latencies, errors)
+            for _ in range(args.clients)
+        ])
+        elapsed = time.perf_counter() - start
+
+    ms = [l * 1000 for l in latencies]
+    print(f"requests: {len(ms)}  clients: {args.clients}  errors: {len(errors)}")
+    print(f"throughput: {len(ms) / elapsed:.1f} req/s")
+    print(
+        f"latency ms  mean {statistics.mean(ms):.1f}  p50 {percentile(ms, 50):.1f}  "
+        f"p95 {percentile(ms, 95):.1f}  p99 {percentile(ms, 99):.1f}  max {max(ms):.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/api/v1/users/check")
+    parser.add_argument("--token", help="bearer token; logs in with --username/--password when omitted")
+    parser.add_argument("--username", default="root@example.com")
+    parser.add_argument("--password", default="secret")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
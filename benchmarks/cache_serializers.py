@@ -0,0 +1,90 @@
+"""
+Encode/decode cost and size of cache entries per serializer.
+
+Builds a document shaped like a user snapshot and, for every available
+serializer, times `--rounds` encodes and decodes through the same codec
+`Cache.set`/`Cache.get` use and reports the entry size. Snapshots
+themselves are stored as hashes of JSON fields, which no serializer
+changes:
+
+    python benchmarks/cache_serializers.py --permissions 40 --rounds 20000
+
+With `--redis-url` each entry is also written to Redis and its
+`MEMORY USAGE` reported, which includes the per-key overhead.
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ms_fa.db.serializers import SERIALIZERS, EnvelopeCodec  # noqa: E402
+
+
+def snapshot(permissions: int, roles: int) -> dict:
+    names = [f"User - Module {i} - action" for i in range(permissions)]
+    return {
+        "id": str(uuid.uuid4()),
+        "kind": "user",
+        "email": "someone@example.com",
+        "permissions": names,
+        "roles": [f"role-{i}" for i in range(roles)],
+        "profile": {
+            "payment_capacity": 12500.5,
+            "second_credit": False,
+            "available_credit": 8300.25,
+        },
+        "mask": "AAAAAAAAAAACBA",
+        "azv": 42,
+    }
+
+
+def measure(codec: EnvelopeCodec, key: str, value: dict, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        raw = codec.encode(key, value, None, 1700000000)
+    encode = (time.perf_counter() - start) / rounds
+    raw = raw.encode() if isinstance(raw, str) else raw
+    start = time.perf_counter()
+    for _ in range(rounds):
+        codec.decode(key, raw)
+    decode = (time.perf_counter() - start) / rounds
+    return raw, encode, decode
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--permissions", type=int, default=40)
+    parser.add_argument("--roles", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=20000)
+    parser.add_argument("--redis-url", help="e.g. redis://127.0.0.1:6379/15")
+    args = parser.parse_args()
+
+    value = snapshot(args.permissions, args.roles)
+    key = f"ms-users-{value['id']}"
+    conn = None
+    if args.redis_url:
+        from redis import Redis
+
+        conn = Redis.from_url(args.redis_url)
+
+    print(f"{'serializer':<10} {'bytes':>7} {'redis':>7} {'encode us':>10} {'decode us':>10}")
+    for name in ["legacy", *SERIALIZERS]:
+        try:
+            codec = EnvelopeCodec(name)
+        except ImportError:
+            print(f"{name:<10} not installed")
+            continue
+        raw, encode, decode = measure(codec, key, value, args.rounds)
+        memory = "-"
+        if conn is not None:
+            conn.set(key, raw)
+            memory = conn.memory_usage(key)
+            conn.delete(key)
+        print(f"{name:<10} {len(raw):>7} {memory:>7} {encode * 1e6:>10.2f} {decode * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
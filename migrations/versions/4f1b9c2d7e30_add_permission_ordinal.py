@@ -0,0 +1,39 @@
+"""add permission ordinal
+
+Revision ID: 4f1b9c2d7e30
+Revises: c2325d987509
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f1b9c2d7e30'
+down_revision: Union[str, None] = 'c2325d987509'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('permission', sa.Column('ordinal', sa.Integer(), nullable=True))
+    op.execute(
+        """
+        UPDATE permission SET ordinal = numbered.ordinal
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY created_at, name) - 1 AS ordinal
+            FROM permission
+        ) AS numbered
+        WHERE permission.id = numbered.id
+        """
+    )
+    op.alter_column('permission', 'ordinal', nullable=False)
+    op.create_unique_constraint('uq_permission_ordinal', 'permission', ['ordinal'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_permission_ordinal', 'permission', type_='unique')
+    op.drop_column('permission', 'ordinal')
@@ -0,0 +1,27 @@
+"""add session indexes
+
+Revision ID: 9a3e5f7c1b24
+Revises: 4f1b9c2d7e30
+Create Date: 2026-10-18 16:40:05.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a3e5f7c1b24'
+down_revision: Union[str, None] = '4f1b9c2d7e30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_session_user_id_updated_at', 'session', ['user_id', 'updated_at'], unique=False)
+    op.create_index('ix_session_token', 'session', ['token'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_session_token', table_name='session')
+    op.drop_index('ix_session_user_id_updated_at', table_name='session')
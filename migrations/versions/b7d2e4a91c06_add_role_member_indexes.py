@@ -0,0 +1,27 @@
+"""add role member indexes
+
+Revision ID: b7d2e4a91c06
+Revises: 9a3e5f7c1b24
+Create Date: 2026-10-18 18:12:47.530196
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e4a91c06'
+down_revision: Union[str, None] = '9a3e5f7c1b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_user_has_roles_role_id', 'user_has_roles', ['role_id'], unique=False)
+    op.create_index('ix_app_has_roles_role_id', 'app_has_roles', ['role_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_app_has_roles_role_id', table_name='app_has_roles')
+    op.drop_index('ix_user_has_roles_role_id', table_name='user_has_roles')
@@ -0,0 +1,44 @@
+"""add introspect tokens permission
+
+Revision ID: d41e8a2b6f53
+Revises: b7d2e4a91c06
+Create Date: 2026-10-19 09:41:12.208734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41e8a2b6f53'
+down_revision: Union[str, None] = 'b7d2e4a91c06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+PERMISSION_ID = '5d0c2f7e-3b7a-4a51-9a0e-8c6f1e2d4b93'
+PERMISSION_NAME = 'User - introspect tokens'
+
+
+def upgrade() -> None:
+    # Seeded databases already have it; existing deployments only get it here
+    op.execute(
+        sa.text(
+            """
+            INSERT INTO permission (id, name, fixed, ordinal)
+            SELECT :id, :name, true, COALESCE(MAX(ordinal), -1) + 1 FROM permission
+            ON CONFLICT (name) DO NOTHING
+            """
+        ).bindparams(id=PERMISSION_ID, name=PERMISSION_NAME)
+    )
+
+
+def downgrade() -> None:
+    # Only the row inserted above; a seeded permission has another id
+    for table in ('role_has_permissions', 'user_has_permissions', 'app_has_permissions'):
+        op.execute(
+            sa.text(f"DELETE FROM {table} WHERE permission_id = :id").bindparams(id=PERMISSION_ID)
+        )
+    op.execute(sa.text("DELETE FROM permission WHERE id = :id").bindparams(id=PERMISSION_ID))
@@ -4,17 +4,27 @@ from contextlib import asynccontextmanager
 
 from ms_fa.config import settings
 from ms_fa.db import engine, Base
-from ms_fa.db.cache import Cache
+from ms_fa.db.cache import Cache, AsyncCache, local_cache
+from ms_fa.helpers.jwt import keyring
+from ms_fa.helpers.revocation import revocations
+from ms_fa.middlewares import RouteAuthzMiddleware, route_table
 from ms_fa.routers import register_routers
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    keyring.load()
     app.state.cache = Cache(settings.redis_config)
+    app.state.async_cache = AsyncCache(settings.redis_config)
+    revocations.start(app.state.cache)
+    local_cache.start(app.state.cache)
+    route_table.compile(app)
     yield
     # Shutdown
-    pass
+    local_cache.stop()
+    revocations.stop()
+    await app.state.async_cache.close()
 
 
 def create_app() -> FastAPI:
@@ -24,6 +34,8 @@ def create_app() -> FastAPI:
         lifespan=lifespan
     )
 
+    app.add_middleware(RouteAuthzMiddleware)
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
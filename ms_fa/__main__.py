@@ -8,6 +8,7 @@ Usage:
     python -m ms_fa create-tables
     python -m ms_fa drop-tables
     python -m ms_fa createsuperuser
+    python -m ms_fa hash-benchmark --target-ms 250
 """
 from ms_fa.commands import main
 
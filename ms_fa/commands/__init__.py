@@ -157,6 +157,96 @@ def createsuperuser(
         db.close()
 
 
+@app.command()
+def hash_benchmark(
+    target_ms: float = typer.Option(
+        250.0,
+        "--target-ms", "-t",
+        help="Target milliseconds per password verification"
+    ),
+    scheme: Optional[str] = typer.Option(
+        None,
+        "--scheme", "-s",
+        help="Benchmark a single scheme (pbkdf2_sha256 or bcrypt)"
+    ),
+    samples: int = typer.Option(
+        5,
+        "--samples", "-n",
+        help="Verifications timed per candidate cost"
+    ),
+):
+    """
+    Benchmark password hashing costs on this machine and recommend settings.
+    
+    For each scheme the cost is raised until one verification takes about
+    twice the target; the highest cost whose median stays within the target
+    is recommended.
+    
+    Examples:
+        python -m ms_fa.commands hash-benchmark
+        python -m ms_fa.commands hash-benchmark --target-ms 100 --scheme bcrypt
+    """
+    import statistics
+    import time
+    from ms_fa.config import settings
+    from ms_fa.helpers.hash import PASSWORD_SCHEMES, build_pwd_context, hash_pool
+    
+    schemes = [scheme] if scheme else list(PASSWORD_SCHEMES)
+    for name in schemes:
+        if name not in PASSWORD_SCHEMES:
+            typer.echo(f"❌ Unsupported scheme '{name}'. Use one of: {', '.join(PASSWORD_SCHEMES)}")
+            raise typer.Exit(1)
+    
+    # pbkdf2 cost is linear in rounds, bcrypt cost is 2**rounds
+    ladders = {
+        "pbkdf2_sha256": ("PASSWORD_PBKDF2_ROUNDS", [25000 * 2 ** i for i in range(12)]),
+        "bcrypt": ("PASSWORD_BCRYPT_ROUNDS", list(range(8, 20))),
+    }
+    
+    current = {
+        "pbkdf2_sha256": settings.PASSWORD_PBKDF2_ROUNDS,
+        "bcrypt": settings.PASSWORD_BCRYPT_ROUNDS,
+    }
+    typer.echo(f"\n⏱️  Target: {target_ms:.0f} ms per verify, {hash_pool.workers} hashing workers")
+    typer.echo(f"   Current policy: {settings.PASSWORD_SCHEME} at cost {current[settings.PASSWORD_SCHEME]}\n")
+    
+    recommendations = []
+    for name in schemes:
+        setting, costs = ladders[name]
+        typer.echo(f"📦 {name}")
+        best = None
+        for cost in costs:
+            kwargs = {"pbkdf2_rounds": cost} if name == "pbkdf2_sha256" else {"bcrypt_rounds": cost}
+            context = build_pwd_context(name, **kwargs)
+            hashed = context.hash("benchmark-password")
+            timings = []
+            for _ in range(samples):
+                start = time.perf_counter()
+                context.verify("benchmark-password", hashed)
+                timings.append((time.perf_counter() - start) * 1000)
+            median = statistics.median(timings)
+            within = median <= target_ms
+            typer.echo(f"   {'✅' if within else '  '} cost {cost:>9}: {median:8.1f} ms")
+            if within:
+                best = (cost, median)
+            if median > target_ms * 2:
+                break
+        if best is None:
+            typer.echo(f"   ❌ Even the lowest cost exceeds {target_ms:.0f} ms\n")
+            continue
+        cost, median = best
+        throughput = hash_pool.workers * 1000 / median
+        typer.echo(f"   → {setting}={cost} (~{median:.1f} ms, ~{throughput:.0f} logins/s per instance)\n")
+        recommendations.append((name, setting, cost, median))
+    
+    if recommendations:
+        name, setting, cost, median = max(recommendations, key=lambda r: r[3])
+        typer.echo("✅ Recommended settings:")
+        typer.echo(f"   PASSWORD_SCHEME={name}")
+        typer.echo(f"   {setting}={cost}\n")
+        typer.echo("   Existing hashes are upgraded on each user's next successful login.\n")
+
+
 def main():
     app()
 
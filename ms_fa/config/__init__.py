@@ -14,6 +14,47 @@ class Settings(BaseSettings):
     APP_TIMEZONE: str = Field(default="America/Mexico_City")
     NOTIFICATION_API_URL: str = Field(default="http://localhost")
 
+    # JWT settings
+    JWT_ALGORITHM: str = Field(default="HS256")
+    JWT_KEYS_DIR: Optional[str] = Field(default=None)
+    JWT_ACTIVE_KID: Optional[str] = Field(default=None)
+    JWT_VERIFY_CACHE_SIZE: int = Field(default=10000)
+    JWT_RETIRED_SECRETS: str = Field(default="")
+    JWT_KEYS_CHECK_INTERVAL: int = Field(default=10)
+    # Accept tokens without a `kid` header, signed with APP_SECRET_KEY or a
+    # retired secret. Disable once issuance has moved to asymmetric keys.
+    JWT_ACCEPT_LEGACY_HS: bool = Field(default=True)
+
+    # Authorization settings
+    AUTHZ_VERSION_TTL: int = Field(default=5)
+    ROLE_MEMBERS_BATCH_SIZE: int = Field(default=1000)
+
+    # Session settings
+    SESSION_MAX_PER_USER: int = Field(default=10)
+    SESSION_REUSE_GRACE: int = Field(default=10)
+
+    # Rate limiting settings (requests per RATE_LIMIT_PERIOD seconds)
+    RATE_LIMIT_ENABLED: bool = Field(default=True)
+    RATE_LIMIT_PERIOD: int = Field(default=60)
+    RATE_LIMIT_LOGIN_PER_USERNAME: int = Field(default=10)
+    RATE_LIMIT_LOGIN_PER_IP: int = Field(default=60)
+    RATE_LIMIT_NOTIFICATION_PER_USERNAME: int = Field(default=3)
+    RATE_LIMIT_NOTIFICATION_PER_IP: int = Field(default=20)
+    RATE_LIMIT_RESET_TOKEN_PER_USERNAME: int = Field(default=5)
+    RATE_LIMIT_RESET_TOKEN_PER_IP: int = Field(default=30)
+    RATE_LIMIT_RESET_TOKEN_PER_TOKEN: int = Field(default=5)
+    # Comma-separated addresses or CIDRs of the proxies in front of the app
+    # (e.g. the ingress). Requests from them are attributed to the right-most
+    # X-Forwarded-For hop that is not itself a trusted proxy.
+    TRUSTED_PROXIES: str = Field(default="")
+
+    # Password hashing settings
+    HASH_POOL_WORKERS: Optional[int] = Field(default=None)
+    HASH_POOL_QUEUE_LIMIT: int = Field(default=64)
+    PASSWORD_SCHEME: str = Field(default="pbkdf2_sha256")
+    PASSWORD_PBKDF2_ROUNDS: int = Field(default=100000)
+    PASSWORD_BCRYPT_ROUNDS: int = Field(default=12)
+
     # Database settings
     DB_CONNECTION: str = Field(default="sqlite")
     DB_HOST: Optional[str] = Field(default=None)
@@ -36,6 +77,18 @@ class Settings(BaseSettings):
     REDIS_USERNAME: str = Field(default="default")
     REDIS_PASSWORD: Optional[str] = Field(default=None)
     REDIS_DB: str = Field(default="0")
+    REDIS_CHUNK_SIZE: int = Field(default=5000)
+    # legacy (JSON envelope, readable by older releases), json, orjson or
+    # msgpack. Principal snapshots are hashes of JSON fields and not affected.
+    CACHE_SERIALIZER: str = Field(default="legacy")
+
+    # In-process cache in front of Redis (0 entries disables it)
+    CACHE_LOCAL_SIZE: int = Field(default=10000)
+    CACHE_LOCAL_TTL: int = Field(default=30)
+
+    # Retired cache generations are unlinked by the reaper task once they are
+    # CACHE_REAP_GRACE seconds old; docker/ms-cron runs it every 5 minutes
+    CACHE_REAP_GRACE: int = Field(default=120)
 
     # S3 settings
     S3_ACCESS_KEY: Optional[str] = Field(default=None)
@@ -63,6 +116,16 @@ class Settings(BaseSettings):
         else:
             raise ValueError(f"Unsupported database connection: {self.DB_CONNECTION}")
 
+    @property
+    def async_database_url(self) -> str:
+        if self.DB_CONNECTION == "sqlite":
+            base_path = Path(__file__).parents[2]
+            return f"sqlite+aiosqlite:///{base_path}/{self.DB_DATABASE}"
+        elif self.DB_CONNECTION == "psql":
+            return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_DATABASE}"
+        else:
+            raise ValueError(f"Unsupported database connection: {self.DB_CONNECTION}")
+
     @property
     def redis_config(self) -> dict:
         return {
@@ -71,6 +134,8 @@ class Settings(BaseSettings):
             "USERNAME": self.REDIS_USERNAME,
             "PASSWORD": self.REDIS_PASSWORD,
             "DATABASE": self.REDIS_DB,
+            "CHUNK_SIZE": self.REDIS_CHUNK_SIZE,
+            "SERIALIZER": self.CACHE_SERIALIZER,
         }
 
     @property
@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from ms_fa.config import settings
 
@@ -11,6 +12,20 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Used by request paths that must not block the event loop (authentication).
+async_engine = create_async_engine(
+    settings.async_database_url,
+    echo=settings.APP_ENV == "development",
+    pool_pre_ping=True
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine
+)
+
 
 class Base(DeclarativeBase):
     pass
@@ -24,6 +39,11 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def db_ping() -> bool:
     try:
         with engine.connect() as conn:
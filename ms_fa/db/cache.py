@@ -1,14 +1,259 @@
 import json
+import logging
+import pickle
+import threading
+import time
 from redis import Redis
-from typing import Any, Union
+from redis.asyncio import Redis as AsyncRedis
+from redis.commands.core import AsyncScript, Script
+from redis.exceptions import ResponseError
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from ms_fa.config import settings
+from ms_fa.db.serializers import EnvelopeCodec
+from ms_fa.helpers.lru import LRUCache
 from ms_fa.helpers.time import epoch_now
 
 
+logger = logging.getLogger(__name__)
+
+CACHE_INVALIDATION_CHANNEL = "ms-users:cache-invalidation"
+
+# Invalidation message that drops every local entry. Other messages hold
+# one or more keys separated by newlines.
+INVALIDATE_ALL = "*"
+
+# Namespaced keys are `{namespace}:{generation}:{id}`, with the current
+# generation of each namespace in a counter. Retired generations wait in a
+# sorted set, scored by retirement time, until `Cache.reap` deletes them.
+GENERATION_KEY_PREFIX = "ms-users:generation"
+RETIRED_GENERATIONS_KEY = "ms-users:generations-retired"
+
+# Snapshot keys of releases before generations (`ms-users-{id}`, no TTL).
+# Nothing reads them any more; `reap_legacy` unlinks them until a full pass
+# finds none, then records that in LEGACY_REAPED_KEY and stops scanning.
+LEGACY_KEY_PATTERNS = ("ms-users-*",)
+LEGACY_REAPED_KEY = "ms-users:legacy-reaped"
+
+
+def chunks(items: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# Field updates of hashes apply only to hashes that already exist (and,
+# when ARGV[1] is not empty, that hold that field), so a partial hash is
+# never created. ARGV[2] is the invalidation channel, ARGV[3..] are
+# field/value pairs.
+UPDATE_HASH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if ARGV[1] ~= '' and redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('PUBLISH', ARGV[2], KEYS[1])
+return 1
+"""
+
+
+# Replaces a hash document in one step, so readers never see it half
+# written. ARGV[1] is the TTL (0 for none), ARGV[2..] field/value pairs.
+SET_HASH_SCRIPT = """
+redis.call('DEL', KEYS[1])
+if #ARGV > 1 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+end
+if tonumber(ARGV[1]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+# Moves a namespace to a new generation and queues the previous one for
+# reaping. KEYS: generation counter, retired set; ARGV: namespace, channel.
+BUMP_GENERATION_SCRIPT = """
+local generation = redis.call('INCR', KEYS[1])
+local now = tonumber(redis.call('TIME')[1])
+redis.call('ZADD', KEYS[2], now, ARGV[1] .. ':' .. (generation - 1))
+redis.call('PUBLISH', ARGV[2], KEYS[1])
+return generation
+"""
+
+
+def generation_key(namespace: str) -> str:
+    return f"{GENERATION_KEY_PREFIX}:{namespace}"
+
+
+def flatten_hash(document: dict) -> Dict[str, str]:
+    """
+    Hash fields of a document. Nested dicts become `parent.child` fields so
+    they can be updated one at a time; values are JSON so any client can
+    read a field with a plain HMGET.
+    """
+    fields = {}
+    for name, value in document.items():
+        if isinstance(value, dict) and value:
+            for child, child_value in value.items():
+                fields[f"{name}.{child}"] = json.dumps(child_value)
+        else:
+            fields[name] = json.dumps(value)
+    return fields
+
+
+def unflatten_hash(fields: Dict[bytes, bytes]) -> Optional[dict]:
+    if not fields:
+        return None
+    document = {}
+    for name, value in fields.items():
+        parent, _, child = name.decode().partition(".")
+        if child:
+            nested = document.get(parent)
+            if not isinstance(nested, dict):
+                nested = document[parent] = {}
+            nested[child] = json.loads(value)
+        elif parent not in document:
+            document[parent] = json.loads(value)
+    return document
+
+
+class LocalCache:
+    """
+    In-process first tier in front of Redis, shared by every `Cache` and
+    `AsyncCache` of the worker.
+
+    Each write through a cache publishes the key on
+    `CACHE_INVALIDATION_CHANNEL`, and a subscriber thread drops it here, so
+    workers and pods see each other's writes. Entries are only served while
+    that subscription is up, and never for longer than `ttl` seconds or the
+    Redis expiry. Processes that never call `start` (e.g. celery workers)
+    read straight from Redis and still publish their writes.
+
+    Entries are kept pickled and every hit gets its own copy, so callers
+    may modify what they read without affecting other requests.
+    """
+
+    def __init__(self, maxsize: int, ttl: int) -> None:
+        self.ttl = ttl
+        self.entries = LRUCache(maxsize=maxsize)
+        self.active = False
+        self.hits = 0
+        self.misses = 0
+        # Bumped by every invalidation; a value read from Redis is only kept
+        # if no invalidation arrived while it was being read.
+        self.epoch = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def lookup(self, key: str) -> Tuple[bool, Any]:
+        if not self.active:
+            return False, None
+        item = self.entries.get(key)
+        if item is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, pickle.loads(item)
+
+    def fill(self, key: str, envelope: Optional[dict], epoch: int) -> None:
+        if envelope is None or not self.active:
+            return
+        expires_at = time.time() + self.ttl
+        if envelope.get("exp"):
+            expires_at = min(expires_at, envelope.get("created_at", 0) + envelope["exp"])
+        item = pickle.dumps(envelope.get("data"), pickle.HIGHEST_PROTOCOL)
+        # Checked and stored under the lock so an invalidation cannot land in between
+        with self._lock:
+            if epoch == self.epoch:
+                self.entries.set(key, item, expires_at)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self.epoch += 1
+        if key == INVALIDATE_ALL:
+            self.entries.clear()
+        else:
+            self.entries.delete(key)
+
+    def invalidate_many(self, keys: Sequence[str]) -> None:
+        with self._lock:
+            self.epoch += 1
+        for key in keys:
+            if key == INVALIDATE_ALL:
+                self.entries.clear()
+            else:
+                self.entries.delete(key)
+
+    def reset(self) -> None:
+        self.invalidate(INVALIDATE_ALL)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+    def start(self, cache: "Cache") -> None:
+        if self.entries.maxsize <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._listen, args=(cache,), name="local-cache-invalidation", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.active = False
+        self.reset()
+
+    def _listen(self, cache: "Cache") -> None:
+        while not self._stop.is_set():
+            pubsub = cache.conn.pubsub()
+            try:
+                pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message["type"] == "subscribe":
+                        # Anything cached before this point may have missed invalidations
+                        self.reset()
+                        self.active = True
+                    elif message["type"] == "message":
+                        self.invalidate_many(message["data"].decode().split("\n"))
+            except Exception as e:
+                logger.warning("Local cache invalidation subscription failed: %s", e)
+                self.active = False
+                self.reset()
+                self._stop.wait(1)
+            finally:
+                self.active = False
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+local_cache = LocalCache(maxsize=settings.CACHE_LOCAL_SIZE, ttl=settings.CACHE_LOCAL_TTL)
+
+
 class Cache:
+    """
+    Redis cache of enveloped values, encoded by the `SERIALIZER` of the
+    config (see `EnvelopeCodec`). The `*_many` methods batch their
+    commands in pipelines of at most `chunk_size` keys (`CHUNK_SIZE` in
+    the config) so bulk work costs one round trip per chunk.
+    """
+
     def __init__(self, config: dict) -> None:
-        self.chunk_size = 5000
+        self.chunk_size = int(config.get("CHUNK_SIZE") or 5000)
         self.config = config
         self.conn = self.connection()
+        self.codec = EnvelopeCodec(config.get("SERIALIZER") or "legacy")
+        self.local = local_cache
+        self._scripts = {}
 
     def connection(self) -> Redis:
         return Redis(
@@ -20,46 +265,375 @@ class Cache:
         )
 
     def set(self, key: str, value: Any, exp: Union[int, None] = None) -> Union[bool, None]:
-        data = json.dumps({
-            "data": value,
-            "key": key,
-            "created_at": epoch_now(),
-            "exp": exp
-        })
-        return self.conn.set(key, data, ex=exp)
+        data = self.codec.encode(key, value, exp, epoch_now())
+        pipe = self.conn.pipeline(transaction=False)
+        pipe.set(key, data, ex=exp)
+        pipe.publish(CACHE_INVALIDATION_CHANNEL, key)
+        result = pipe.execute()[0]
+        self.local.invalidate(key)
+        return result
+
+    def set_many(
+        self,
+        items: Dict[str, Any],
+        exp: Union[int, Dict[str, Optional[int]], None] = None
+    ) -> None:
+        """Store many values; `exp` is one TTL for all keys or a TTL per key."""
+        now = epoch_now()
+        for chunk in chunks(list(items.items()), self.chunk_size):
+            pipe = self.conn.pipeline(transaction=False)
+            for key, value in chunk:
+                ttl = exp.get(key) if isinstance(exp, dict) else exp
+                pipe.set(key, self.codec.encode(key, value, ttl, now), ex=ttl)
+            keys = [key for key, _ in chunk]
+            pipe.publish(CACHE_INVALIDATION_CHANNEL, "\n".join(keys))
+            pipe.execute()
+            self.local.invalidate_many(keys)
 
     def get(self, key: str) -> Union[Any, None]:
+        found, value = self.local.lookup(key)
+        if found:
+            return value
+        epoch = self.local.epoch
         data = self.get_raw(key)
+        self.local.fill(key, data, epoch)
         return None if data is None else data.get("data")
 
+    def get_many(self, keys: List[str]) -> List[Union[Any, None]]:
+        if not keys:
+            return []
+        result, missing = [], []
+        for i, key in enumerate(keys):
+            found, value = self.local.lookup(key)
+            result.append(value)
+            if not found:
+                missing.append(i)
+        for chunk in chunks(missing, self.chunk_size):
+            epoch = self.local.epoch
+            values = self.conn.mget([keys[i] for i in chunk])
+            for i, v in zip(chunk, values):
+                data = None if v is None else self.codec.decode(keys[i], v)
+                self.local.fill(keys[i], data, epoch)
+                result[i] = None if data is None else data.get("data")
+        return result
+
     def get_raw(self, key: str) -> Union[dict, None]:
         data = self.conn.get(key)
         if data is not None:
-            data = json.loads(data)
+            data = self.codec.decode(key, data)
         return data
 
     def delete(self, key: str) -> int:
-        return self.conn.delete(key)
+        pipe = self.conn.pipeline(transaction=False)
+        pipe.delete(key)
+        pipe.publish(CACHE_INVALIDATION_CHANNEL, key)
+        result = pipe.execute()[0]
+        self.local.invalidate(key)
+        return result
+
+    def delete_many(self, keys: List[str]) -> int:
+        """Delete many keys; returns how many existed."""
+        deleted = 0
+        for chunk in chunks(keys, self.chunk_size):
+            pipe = self.conn.pipeline(transaction=False)
+            pipe.delete(*chunk)
+            pipe.publish(CACHE_INVALIDATION_CHANNEL, "\n".join(chunk))
+            deleted += pipe.execute()[0]
+            self.local.invalidate_many(chunk)
+        return deleted
+
+    def truncate(self, namespace: str) -> bool:
+        """
+        Drop every key of `namespace` in O(1) by moving it to a new
+        generation. The old keys are no longer read and `reap` unlinks them
+        in the background.
+        """
+        key = generation_key(namespace)
+        self.script(BUMP_GENERATION_SCRIPT)(
+            keys=[key, RETIRED_GENERATIONS_KEY],
+            args=[namespace, CACHE_INVALIDATION_CHANNEL]
+        )
+        self.local.invalidate(key)
+        return True
+
+    def generation(self, namespace: str) -> int:
+        key = generation_key(namespace)
+        found, value = self.local.lookup(key)
+        if found:
+            return value
+        epoch = self.local.epoch
+        value = self.counter(key)
+        self.local.fill(key, {"data": value}, epoch)
+        return value
 
-    def truncate(self, prefix: str = None) -> bool:
+    def namespace_prefix(self, namespace: str) -> str:
+        """Prefix of the keys of the current generation of `namespace`."""
+        return f"{namespace}:{self.generation(namespace)}:"
+
+    def reap(self, grace: int = 0) -> int:
+        """
+        UNLINK the keys of generations retired more than `grace` seconds
+        ago, scanning `chunk_size` keys per step. Writers still holding an
+        old generation can add to it until their local copy is invalidated,
+        so `grace` should outlast the local cache TTL. Returns the number
+        of keys removed.
+        """
+        removed = 0
+        retired = self.conn.zrangebyscore(RETIRED_GENERATIONS_KEY, "-inf", epoch_now() - grace)
+        for member in retired:
+            for keys in self.scan_batches(f"{member.decode()}:*"):
+                removed += self.conn.unlink(*keys)
+            self.conn.zrem(RETIRED_GENERATIONS_KEY, member)
+        return removed
+
+    def reap_legacy(self) -> int:
+        """
+        UNLINK snapshot keys left by releases before generations. Keeps
+        scanning on every call while older pods may still write them, and
+        becomes a no-op after a pass that finds nothing. Returns the number
+        of keys removed.
+        """
+        if self.conn.exists(LEGACY_REAPED_KEY):
+            return 0
+        removed = 0
+        for pattern in LEGACY_KEY_PATTERNS:
+            for keys in self.scan_batches(pattern):
+                removed += self.conn.unlink(*keys)
+        if not removed:
+            self.conn.set(LEGACY_REAPED_KEY, epoch_now())
+        return removed
+
+    def scan_batches(self, match: str) -> Iterator[List[bytes]]:
         cursor = None
         while cursor != 0:
-            c = cursor or 0
-            cursor, keys = self.conn.scan(
-                cursor=c,
-                match=f"{prefix}*" if prefix else "*",
-                count=self.chunk_size
-            )
+            cursor, keys = self.conn.scan(cursor=cursor or 0, match=match, count=self.chunk_size)
             if keys:
-                self.conn.delete(*keys)
-        return True
+                yield keys
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self.conn.incr(key, amount)
+
+    def counter(self, key: str) -> int:
+        value = self.conn.get(key)
+        return 0 if value is None else int(value)
+
+    def set_hash(self, key: str, document: dict, exp: Union[int, None] = None) -> None:
+        """
+        Store a document as a hash, replacing whatever the key held. Field
+        values are always JSON; `codec` only applies to `set`/`get` values.
+        """
+        self.set_hashes({key: document}, exp)
+
+    def set_hashes(self, documents: Dict[str, dict], exp: Union[int, None] = None) -> None:
+        """
+        Store many documents. Each key is replaced atomically by its own
+        script call; a chunk is pipelined, not wrapped in one MULTI, so
+        Redis never blocks on a whole chunk.
+        """
+        script = self.script(SET_HASH_SCRIPT)
+        for chunk in chunks(list(documents.items()), self.chunk_size):
+            pipe = self.conn.pipeline(transaction=False)
+            for key, document in chunk:
+                args = [exp or 0]
+                for field, value in flatten_hash(document).items():
+                    args.extend([field, value])
+                script(keys=[key], args=args, client=pipe)
+            keys = [key for key, _ in chunk]
+            pipe.publish(CACHE_INVALIDATION_CHANNEL, "\n".join(keys))
+            pipe.execute()
+            self.local.invalidate_many(keys)
+
+    def get_hash(self, key: str) -> Optional[dict]:
+        return self.get_hashes([key])[0]
+
+    def get_hashes(self, keys: List[str]) -> List[Optional[dict]]:
+        """
+        Documents stored with `set_hash`. Keys still holding a value of
+        another type (e.g. written by an older release) read as missing.
+        """
+        result, missing = [], []
+        for i, key in enumerate(keys):
+            found, value = self.local.lookup(key)
+            result.append(value)
+            if not found:
+                missing.append(i)
+        for chunk in chunks(missing, self.chunk_size):
+            epoch = self.local.epoch
+            pipe = self.conn.pipeline(transaction=False)
+            for i in chunk:
+                pipe.hgetall(keys[i])
+            for i, fields in zip(chunk, pipe.execute(raise_on_error=False)):
+                document = None if isinstance(fields, ResponseError) else unflatten_hash(fields)
+                if document is not None:
+                    self.local.fill(keys[i], {"data": document}, epoch)
+                result[i] = document
+        return result
+
+    def update_hash(self, key: str, values: Dict[str, Any], if_field: Optional[str] = None) -> bool:
+        """
+        Set some fields of an existing hash document. Nothing is written when
+        the key is missing, or lacks `if_field`; returns whether it was.
+        """
+        args = [if_field or "", CACHE_INVALIDATION_CHANNEL]
+        for field, value in values.items():
+            args.extend([field, json.dumps(value)])
+        try:
+            updated = bool(self.script(UPDATE_HASH_SCRIPT)(keys=[key], args=args))
+        except ResponseError:
+            return False
+        if updated:
+            self.local.invalidate(key)
+        return updated
 
     def exists(self, key: str) -> bool:
         return self.conn.exists(key) > 0
 
+    def exists_many(self, keys: List[str]) -> List[bool]:
+        result = []
+        for chunk in chunks(keys, self.chunk_size):
+            pipe = self.conn.pipeline(transaction=False)
+            for key in chunk:
+                pipe.exists(key)
+            result.extend(n > 0 for n in pipe.execute())
+        return result
+
+    def script(self, source: str) -> Script:
+        """Lua script bound to this connection; runs with EVALSHA after the first call."""
+        script = self._scripts.get(source)
+        if script is None:
+            script = self._scripts[source] = self.conn.register_script(source)
+        return script
+
     def ping(self) -> bool:
         try:
             return self.conn.ping()
         except Exception:
             return False
 
+
+class AsyncCache:
+    """
+    `Cache` counterpart on `redis.asyncio` for code running on the event
+    loop. Reads and writes the same entries, so both can share keys.
+    """
+
+    def __init__(self, config: dict) -> None:
+        self.config = config
+        self.conn = self.connection()
+        self.codec = EnvelopeCodec(config.get("SERIALIZER") or "legacy")
+        self.local = local_cache
+        self._scripts = {}
+
+    def connection(self) -> AsyncRedis:
+        return AsyncRedis(
+            host=self.config.get("HOST"),
+            port=self.config.get("PORT"),
+            username=self.config.get("USERNAME"),
+            password=self.config.get("PASSWORD"),
+            db=self.config.get("DATABASE")
+        )
+
+    async def set(self, key: str, value: Any, exp: Union[int, None] = None) -> Union[bool, None]:
+        data = self.codec.encode(key, value, exp, epoch_now())
+        pipe = self.conn.pipeline(transaction=False)
+        pipe.set(key, data, ex=exp)
+        pipe.publish(CACHE_INVALIDATION_CHANNEL, key)
+        result = (await pipe.execute())[0]
+        self.local.invalidate(key)
+        return result
+
+    async def get(self, key: str) -> Union[Any, None]:
+        found, value = self.local.lookup(key)
+        if found:
+            return value
+        epoch = self.local.epoch
+        data = await self.get_raw(key)
+        self.local.fill(key, data, epoch)
+        return None if data is None else data.get("data")
+
+    async def get_many(self, keys: List[str]) -> List[Union[Any, None]]:
+        if not keys:
+            return []
+        result, missing = [], []
+        for i, key in enumerate(keys):
+            found, value = self.local.lookup(key)
+            result.append(value)
+            if not found:
+                missing.append(i)
+        if missing:
+            epoch = self.local.epoch
+            values = await self.conn.mget([keys[i] for i in missing])
+            for i, v in zip(missing, values):
+                data = None if v is None else self.codec.decode(keys[i], v)
+                self.local.fill(keys[i], data, epoch)
+                result[i] = None if data is None else data.get("data")
+        return result
+
+    async def get_raw(self, key: str) -> Union[dict, None]:
+        data = await self.conn.get(key)
+        if data is not None:
+            data = self.codec.decode(key, data)
+        return data
+
+    async def set_hash(self, key: str, document: dict, exp: Union[int, None] = None) -> None:
+        """Store a document as a hash with the same script as `Cache.set_hash`."""
+        args = [exp or 0]
+        for field, value in flatten_hash(document).items():
+            args.extend([field, value])
+        pipe = self.conn.pipeline(transaction=False)
+        await self.script(SET_HASH_SCRIPT)(keys=[key], args=args, client=pipe)
+        pipe.publish(CACHE_INVALIDATION_CHANNEL, key)
+        await pipe.execute()
+        self.local.invalidate(key)
+
+    async def get_hash(self, key: str) -> Optional[dict]:
+        found, value = self.local.lookup(key)
+        if found:
+            return value
+        epoch = self.local.epoch
+        try:
+            document = unflatten_hash(await self.conn.hgetall(key))
+        except ResponseError:
+            return None
+        if document is not None:
+            self.local.fill(key, {"data": document}, epoch)
+        return document
+
+    async def generation(self, namespace: str) -> int:
+        key = generation_key(namespace)
+        found, value = self.local.lookup(key)
+        if found:
+            return value
+        epoch = self.local.epoch
+        value = await self.conn.get(key)
+        value = 0 if value is None else int(value)
+        self.local.fill(key, {"data": value}, epoch)
+        return value
+
+    async def namespace_prefix(self, namespace: str) -> str:
+        return f"{namespace}:{await self.generation(namespace)}:"
+
+    async def delete(self, key: str) -> int:
+        pipe = self.conn.pipeline(transaction=False)
+        pipe.delete(key)
+        pipe.publish(CACHE_INVALIDATION_CHANNEL, key)
+        result = (await pipe.execute())[0]
+        self.local.invalidate(key)
+        return result
+
+    async def exists(self, key: str) -> bool:
+        return await self.conn.exists(key) > 0
+
+    async def counter(self, key: str) -> int:
+        value = await self.conn.get(key)
+        return 0 if value is None else int(value)
+
+    def script(self, source: str) -> AsyncScript:
+        """Lua script bound to this connection; runs with EVALSHA after the first call."""
+        script = self._scripts.get(source)
+        if script is None:
+            script = self._scripts[source] = self.conn.register_script(source)
+        return script
+
+    async def close(self) -> None:
+        await self.conn.aclose()
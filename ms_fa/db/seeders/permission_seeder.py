@@ -31,6 +31,7 @@ class PermissionSeeder(Seeder):
             Permission({"name": "User - delete", "fixed": True}),
             Permission({"name": "User - validate email", "fixed": True}),
             Permission({"name": "User - generate token", "fixed": True}),
+            Permission({"name": "User - introspect tokens", "fixed": True}),
             
             # App permissions
             Permission({"name": "User - App - create", "fixed": True}),
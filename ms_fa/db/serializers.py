@@ -0,0 +1,136 @@
+import json
+import struct
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Union
+
+
+# Versioned header of binary entries: magic, header version, serializer id,
+# created_at and exp (0 when the entry does not expire). 0xC1 is never used
+# by msgpack and cannot start a JSON document, so it tells binary entries
+# apart from legacy JSON envelopes.
+MAGIC = 0xC1
+HEADER_VERSION = 1
+HEADER = struct.Struct("<BBBII")
+
+
+class Serializer(ABC):
+    """Encoding of the cached value itself, identified in the header by `id`."""
+
+    id: int
+    name: str
+
+    @abstractmethod
+    def dumps(self, value: Any) -> bytes:
+        pass
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any:
+        pass
+
+
+class JsonSerializer(Serializer):
+    id = 1
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer(Serializer):
+    id = 2
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._orjson = orjson
+
+    def dumps(self, value: Any) -> bytes:
+        return self._orjson.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        return self._orjson.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    id = 3
+    name = "msgpack"
+
+    def __init__(self) -> None:
+        import msgpack
+
+        self._msgpack = msgpack
+
+    def dumps(self, value: Any) -> bytes:
+        return self._msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return self._msgpack.unpackb(data, raw=False)
+
+
+SERIALIZERS = {cls.name: cls for cls in (JsonSerializer, OrjsonSerializer, MsgpackSerializer)}
+
+
+class EnvelopeCodec:
+    """
+    Turns cached values into Redis payloads and back.
+
+    With a serializer, entries are written as a binary header followed by
+    the serialized value; the key is not repeated inside the entry. With
+    `legacy` the original JSON envelope (`data`, `key`, `created_at`,
+    `exp`) is written, which keeps older workers able to read new entries
+    during a rollout. Both formats are always readable; entries written by
+    a serializer that is not installed here read as missing.
+    """
+
+    def __init__(self, name: str = "legacy") -> None:
+        self.name = name
+        self.serializer: Optional[Serializer] = None
+        if name != "legacy":
+            if name not in SERIALIZERS:
+                raise ValueError(f"Unknown cache serializer '{name}'")
+            self.serializer = SERIALIZERS[name]()
+        self._readers: Dict[int, Optional[Serializer]] = {}
+
+    def encode(self, key: str, value: Any, exp: Union[int, None], created_at: int) -> Union[bytes, str]:
+        if self.serializer is None:
+            return json.dumps({
+                "data": value,
+                "key": key,
+                "created_at": created_at,
+                "exp": exp
+            })
+        header = HEADER.pack(MAGIC, HEADER_VERSION, self.serializer.id, created_at, exp or 0)
+        return header + self.serializer.dumps(value)
+
+    def decode(self, key: str, raw: bytes) -> Optional[dict]:
+        """The entry as an envelope dict, whatever format it was written in."""
+        if not raw:
+            return None
+        if raw[0] != MAGIC:
+            return json.loads(raw)
+        _, version, serializer_id, created_at, exp = HEADER.unpack_from(raw)
+        serializer = self.reader(serializer_id) if version == HEADER_VERSION else None
+        if serializer is None:
+            return None
+        return {
+            "data": serializer.loads(raw[HEADER.size:]),
+            "key": key,
+            "created_at": created_at,
+            "exp": exp or None,
+        }
+
+    def reader(self, serializer_id: int) -> Optional[Serializer]:
+        if serializer_id not in self._readers:
+            serializer = None
+            for cls in SERIALIZERS.values():
+                if cls.id == serializer_id:
+                    try:
+                        serializer = cls()
+                    except ImportError:
+                        pass
+            self._readers[serializer_id] = serializer
+        return self._readers[serializer_id]
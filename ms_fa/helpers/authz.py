@@ -0,0 +1,178 @@
+import base64
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+
+from ms_fa.config import settings
+
+
+AUTHZ_VERSION_KEY = "ms-users:authz-version"
+
+
+def encode_bitset(ordinals: Iterable[int]) -> str:
+    mask = 0
+    for ordinal in ordinals:
+        mask |= 1 << ordinal
+    raw = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_bitset(value: str) -> int:
+    raw = base64.b64decode(value + "=" * (-len(value) % 4), altchars=b"-_", validate=True)
+    return int.from_bytes(raw, "little")
+
+
+class Authz:
+    """
+    Process-wide view of permission ordinals and the global authz version.
+
+    The version is a Redis counter bumped whenever role or permission
+    assignments change. Tokens are stamped with the version they were
+    issued under; their embedded bitset is only trusted while the stamp
+    matches. The local copy of the version is re-read at most once per
+    `refresh_interval` seconds, and the ordinal map is reloaded whenever
+    the version moves.
+    """
+
+    def __init__(self, refresh_interval: int = 5) -> None:
+        self.refresh_interval = refresh_interval
+        self.version: Optional[int] = None
+        self.ordinals: Dict[str, int] = {}
+        self.names_by_ordinal: Dict[int, str] = {}
+        # Bumped on every ordinal reload so compiled masks know to rebuild
+        self.generation = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load_ordinals(self) -> Dict[str, int]:
+        from ms_fa.db import SessionLocal
+        from ms_fa.models import Permission
+
+        db = SessionLocal()
+        try:
+            rows = db.query(Permission.name, Permission.ordinal).all()
+        finally:
+            db.close()
+        self.ordinals = {name: ordinal for name, ordinal in rows}
+        self.names_by_ordinal = {ordinal: name for name, ordinal in rows}
+        self.generation += 1
+        return self.ordinals
+
+    def current_version(self, cache, fresh: bool = False) -> int:
+        now = time.monotonic()
+        if not fresh and self.version is not None and now - self._checked_at < self.refresh_interval:
+            return self.version
+        with self._lock:
+            version = cache.counter(AUTHZ_VERSION_KEY) if cache is not None else 0
+            self._apply_version(version, now)
+        return self.version
+
+    async def current_version_async(self, cache, fresh: bool = False) -> int:
+        """
+        `current_version` for the event loop: the counter is read through
+        `cache`, an `AsyncCache`, and ordinals are reloaded in the thread
+        pool, so neither blocks the loop.
+        """
+        now = time.monotonic()
+        if not fresh and self.version is not None and now - self._checked_at < self.refresh_interval:
+            return self.version
+        version = await cache.counter(AUTHZ_VERSION_KEY) if cache is not None else 0
+        if version == self.version:
+            self._checked_at = now
+            return self.version
+        await run_in_threadpool(self._reload, version, now)
+        return self.version
+
+    def _reload(self, version: int, now: float) -> None:
+        with self._lock:
+            self._apply_version(version, now)
+
+    def _apply_version(self, version: int, now: float) -> None:
+        if version != self.version:
+            self.load_ordinals()
+            self.version = version
+        self._checked_at = now
+
+    def bump(self, cache) -> None:
+        if cache is None:
+            return
+        with self._lock:
+            self.version = cache.incr(AUTHZ_VERSION_KEY)
+            self.load_ordinals()
+            self._checked_at = time.monotonic()
+
+    def is_current(self, version: Optional[int], cache) -> bool:
+        return version is not None and version == self.current_version(cache)
+
+    async def is_current_async(self, version: Optional[int], cache) -> bool:
+        return version is not None and version == await self.current_version_async(cache)
+
+    def mask(self, names: Iterable[str]) -> int:
+        mask = 0
+        for name in names:
+            ordinal = self.ordinals.get(name)
+            if ordinal is not None:
+                mask |= 1 << ordinal
+        return mask
+
+    def bitset(self, names: Iterable[str]) -> str:
+        return encode_bitset(
+            self.ordinals[name] for name in names if name in self.ordinals
+        )
+
+    def stamp(self, snapshot: dict, version: Optional[int]) -> dict:
+        """
+        Add the permission bitmask of a principal snapshot and the authz
+        version it was computed under. `version` must be read before the
+        permissions were loaded; snapshots are left as they are without one.
+        """
+        if version is not None:
+            snapshot["mask"] = self.bitset(snapshot["permissions"])
+            snapshot["azv"] = version
+        return snapshot
+
+    def compile(self, names: Iterable[str]) -> "PermissionMask":
+        return PermissionMask(self, names)
+
+    def decode(self, mask: int) -> List[Tuple[int, str]]:
+        """`(ordinal, name)` pairs of the bits set in `mask`, in ordinal order."""
+        pairs = []
+        ordinal = 0
+        while mask:
+            if mask & 1:
+                pairs.append((ordinal, self.names_by_ordinal.get(ordinal)))
+            mask >>= 1
+            ordinal += 1
+        return pairs
+
+
+class PermissionMask:
+    """
+    Bitmask of a fixed set of permission names, e.g. the arguments of
+    `require_permissions`. Built when the dependency is declared and
+    resolved to bits on first use, since ordinals live in the database;
+    it is rebuilt only when the ordinal map is reloaded.
+    """
+
+    def __init__(self, authz: Authz, names: Iterable[str]) -> None:
+        self.names = tuple(names)
+        self._authz = authz
+        self._generation = None
+        self._value = 0
+
+    def __repr__(self):
+        return f"<permission_mask {self.names}>"
+
+    @property
+    def value(self) -> int:
+        if self._generation != self._authz.generation:
+            self._value = self._authz.mask(self.names)
+            self._generation = self._authz.generation
+        return self._value
+
+    def allows(self, mask: int) -> bool:
+        return bool(mask & self.value)
+
+
+authz = Authz(refresh_interval=settings.AUTHZ_VERSION_TTL)
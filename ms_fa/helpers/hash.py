@@ -1,6 +1,45 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from ms_fa.config import settings
+
+# Every supported scheme stays verifiable so hashes created under an older
+# policy keep working and are upgraded on the next successful login.
+PASSWORD_SCHEMES = ("pbkdf2_sha256", "bcrypt")
+
+
+def build_pwd_context(
+    scheme: Optional[str] = None,
+    pbkdf2_rounds: Optional[int] = None,
+    bcrypt_rounds: Optional[int] = None
+) -> CryptContext:
+    """
+    Password policy: new hashes use `scheme` at the configured cost, and
+    hashes in another scheme or below that cost are flagged for rehash.
+    """
+    scheme = scheme or settings.PASSWORD_SCHEME
+    if scheme not in PASSWORD_SCHEMES:
+        raise ValueError(f"Unsupported password scheme: {scheme}")
+    pbkdf2_rounds = pbkdf2_rounds or settings.PASSWORD_PBKDF2_ROUNDS
+    bcrypt_rounds = bcrypt_rounds or settings.PASSWORD_BCRYPT_ROUNDS
+    return CryptContext(
+        schemes=[scheme] + [s for s in PASSWORD_SCHEMES if s != scheme],
+        default=scheme,
+        deprecated="auto",
+        pbkdf2_sha256__default_rounds=pbkdf2_rounds,
+        pbkdf2_sha256__min_rounds=pbkdf2_rounds,
+        pbkdf2_sha256__salt_size=12,
+        bcrypt__default_rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+    )
+
+
+pwd_context = build_pwd_context()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -10,3 +49,72 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; on success also return a new hash if the stored one is outdated."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class HashPool:
+    """
+    Worker threads for password hashing, kept off the event loop.
+
+    pbkdf2 and bcrypt release the GIL while hashing, so threads run in
+    parallel. At most `workers + queue_limit` calls are admitted at once;
+    any call beyond that is rejected with a 503, so an overload sheds logins
+    instead of stalling every route.
+    """
+
+    def __init__(self, workers: int, queue_limit: int) -> None:
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._pending >= self.workers + self.queue_limit:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server busy, try again later",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._call, fn, args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _call(self, fn: Callable[..., Any], args: tuple) -> Any:
+        with self._lock:
+            self._active += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "active": self._active,
+                "queued": max(0, self._pending - self._active),
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+
+hash_pool = HashPool(
+    workers=settings.HASH_POOL_WORKERS or os.cpu_count() or 1,
+    queue_limit=settings.HASH_POOL_QUEUE_LIMIT
+)
@@ -1,33 +1,341 @@
+import hashlib
+import json
+import os
+import threading
+import time
 import jwt
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from ms_fa.config import settings
+from ms_fa.helpers.lru import LRUCache
 from ms_fa.helpers.time import epoch_now
 
 
+# Version of the claim layout issued by `get_token` and `generate_app_token`.
+# Tokens minted before the `kind`/`ver` claims existed carry neither.
+TOKEN_VERSION = 1
+
+# Claims of tokens that already passed signature verification, keyed by
+# the token digest and dropped at the token's own `exp`.
+verified_tokens = LRUCache(maxsize=settings.JWT_VERIFY_CACHE_SIZE)
+
+
+class JwtKey:
+    """
+    Signing key identified by `kid`.
+
+    Asymmetric keys loaded from a private PEM can sign and verify; keys
+    loaded from a public PEM (e.g. retired signing keys) can only verify.
+    HMAC keys hold the shared secret as both halves.
+    """
+
+    def __init__(self, kid: str, algorithm: str, public_key: Any, private_key: Any = None):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.public_key = public_key
+        self.private_key = private_key
+
+    def __repr__(self):
+        return f"<jwt_key kid={self.kid} alg={self.algorithm}>"
+
+    @property
+    def can_sign(self) -> bool:
+        return self.private_key is not None
+
+    @property
+    def is_symmetric(self) -> bool:
+        return self.algorithm.startswith('HS')
+
+    def jwk(self) -> Dict[str, Any]:
+        if self.algorithm == 'EdDSA':
+            from jwt.algorithms import OKPAlgorithm as Algorithm
+        else:
+            from jwt.algorithms import RSAAlgorithm as Algorithm
+        data = json.loads(Algorithm.to_jwk(self.public_key))
+        data.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return data
+
+
+def key_algorithm(key: Any, algorithm: str) -> str:
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return 'EdDSA'
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return algorithm if algorithm[:2] in ('RS', 'PS') else 'RS256'
+    raise ValueError(f"Unsupported JWT key type: {type(key).__name__}")
+
+
+def hmac_key(secret: str, algorithm: str, kid: Optional[str] = None) -> JwtKey:
+    # The default kid is derived from the secret so every worker agrees on
+    # it without configuration and the secret itself is never exposed.
+    kid = kid or 'hs-' + hashlib.sha256(secret.encode()).hexdigest()[:16]
+    return JwtKey(kid, algorithm if algorithm.startswith('HS') else 'HS256', secret, secret)
+
+
+def load_keys(path: str, algorithm: str) -> Dict[str, JwtKey]:
+    """
+    Load every key in `path`. `{kid}.pem` files hold private keys,
+    `{kid}.pub.pem` files hold verification-only public keys and
+    `{kid}.hmac` files hold HMAC secrets.
+    """
+    from cryptography.hazmat.primitives.serialization import (
+        load_pem_private_key,
+        load_pem_public_key,
+    )
+
+    keys = {}
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith(('.pem', '.hmac')):
+            continue
+        with open(os.path.join(path, filename), 'rb') as f:
+            data = f.read()
+        if filename.endswith('.hmac'):
+            kid = filename[:-len('.hmac')]
+            keys[kid] = hmac_key(data.decode().strip(), algorithm, kid)
+        elif filename.endswith('.pub.pem'):
+            kid = filename[:-len('.pub.pem')]
+            public_key = load_pem_public_key(data)
+            keys.setdefault(kid, JwtKey(kid, key_algorithm(public_key, algorithm), public_key))
+        else:
+            kid = filename[:-len('.pem')]
+            private_key = load_pem_private_key(data, password=None)
+            keys[kid] = JwtKey(
+                kid,
+                key_algorithm(private_key, algorithm),
+                private_key.public_key(),
+                private_key
+            )
+    return keys
+
+
+class KeyRing:
+    """
+    Process-wide set of JWT keys: the active signing key plus retired keys
+    that still verify tokens issued before a rotation, selected by `kid`.
+
+    Keys come from `APP_SECRET_KEY`, `JWT_RETIRED_SECRETS` and the files in
+    `JWT_KEYS_DIR`. The directory is re-read when its contents change,
+    checked at most every `check_interval` seconds, so keys can be added,
+    activated (`JWT_ACTIVE_KID` or an `active` file holding the kid) and
+    retired without a restart.
+
+    With `accept_legacy` off, tokens without `kid` are rejected, and with
+    an asymmetric algorithm the shared secrets are not loaded at all, so
+    they can no longer be used to forge tokens.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        algorithm: str,
+        secret: str = '',
+        retired_secrets: Optional[List[str]] = None,
+        active_kid: Optional[str] = None,
+        check_interval: int = 10,
+        accept_legacy: bool = True
+    ):
+        self.path = path
+        self.algorithm = algorithm
+        self.secret = secret
+        self.retired_secrets = retired_secrets or []
+        self.active_kid = active_kid
+        self.check_interval = check_interval
+        self.accept_legacy = accept_legacy
+        self._keys: Optional[Dict[str, JwtKey]] = None
+        self._hmac: List[JwtKey] = []
+        self._active: Optional[str] = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def keys(self) -> Dict[str, JwtKey]:
+        if self._keys is None:
+            self.load()
+        return self._keys
+
+    def load(self) -> None:
+        keys, hmac_keys = {}, []
+        secrets = [self.secret] + self.retired_secrets
+        if not self.accept_legacy and not self.algorithm.startswith('HS'):
+            secrets = []
+        for secret in secrets:
+            if secret:
+                key = hmac_key(secret, self.algorithm)
+                keys[key.kid] = key
+                hmac_keys.append(key)
+
+        active = self.active_kid
+        fingerprint = self.fingerprint()
+        if self.path:
+            keys.update(load_keys(self.path, self.algorithm))
+            active_file = os.path.join(self.path, 'active')
+            if os.path.exists(active_file):
+                with open(active_file) as f:
+                    active = f.read().strip() or active
+
+        with self._lock:
+            changed = self._keys is not None
+            self._keys = keys
+            self._hmac = hmac_keys
+            self._active = active
+            self._fingerprint = fingerprint
+            self._checked_at = time.monotonic()
+        if changed:
+            # Tokens verified with a key that is gone must not stay valid
+            verified_tokens.clear()
+
+    def fingerprint(self):
+        if not self.path:
+            return None
+        return tuple(sorted(
+            (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in os.scandir(self.path)
+        ))
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload if the key directory changed; returns whether it did."""
+        if self._keys is None:
+            self.load()
+            return True
+        if not self.path:
+            return False
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return False
+        # Lookups of unknown kids force a check; still bound them to one a second
+        if now - self._checked_at < 1:
+            return False
+        self._checked_at = now
+        if self.fingerprint() == self._fingerprint:
+            return False
+        self.load()
+        return True
+
+    def get(self, kid: str) -> Optional[JwtKey]:
+        self.refresh()
+        key = self.keys.get(kid)
+        if key is None and self.refresh(force=True):
+            key = self.keys.get(kid)
+        return key
+
+    def legacy_keys(self) -> List[JwtKey]:
+        """HMAC keys accepted for tokens issued without a `kid` header."""
+        self.refresh()
+        return self._hmac if self.accept_legacy else []
+
+    def signing_key(self) -> JwtKey:
+        self.refresh()
+        keys = self.keys
+        kid = self._active
+        if kid is None:
+            if self.algorithm.startswith('HS'):
+                signing = self._hmac[:1]
+            else:
+                signing = [k for k in keys.values() if k.can_sign and not k.is_symmetric]
+            kid = signing[0].kid if len(signing) == 1 else None
+        key = keys.get(kid)
+        if key is None or not key.can_sign:
+            raise RuntimeError(f"No private JWT signing key available for kid '{kid}'")
+        return key
+
+    def jwks(self) -> Dict[str, List[Dict[str, Any]]]:
+        self.refresh()
+        return {"keys": [key.jwk() for key in self.keys.values() if not key.is_symmetric]}
+
+
+keyring = KeyRing(
+    path=settings.JWT_KEYS_DIR,
+    algorithm=settings.JWT_ALGORITHM,
+    secret=settings.APP_SECRET_KEY,
+    retired_secrets=[s.strip() for s in settings.JWT_RETIRED_SECRETS.split(',') if s.strip()],
+    active_kid=settings.JWT_ACTIVE_KID,
+    check_interval=settings.JWT_KEYS_CHECK_INTERVAL,
+    accept_legacy=settings.JWT_ACCEPT_LEGACY_HS
+)
+
+
+def jwks() -> Dict[str, List[Dict[str, Any]]]:
+    return keyring.jwks()
+
+
 class JwtHelper:
     def __init__(
         self,
-        algorithms: str = 'HS256',
+        algorithms: Optional[str] = None,
         token_lifetime: int = 43200,
         refresh_token_lifetime: int = 86400,
         token_type: str = 'Bearer'
     ):
-        self.key = settings.APP_SECRET_KEY
-        self.algorithms = algorithms
+        self.keyring = keyring
+        self.algorithms = algorithms or settings.JWT_ALGORITHM
         self.token_type = token_type
         self.token_lifetime = token_lifetime
         self.refresh_token_lifetime = refresh_token_lifetime
 
+    @property
+    def is_symmetric(self) -> bool:
+        return self.algorithms.startswith('HS')
+
     def encode(self, payload: Dict[str, Any], lifetime: int) -> str:
         payload_copy = payload.copy()
         payload_copy['exp'] = epoch_now() + lifetime
-        encoded = jwt.encode(payload_copy, self.key, algorithm=self.algorithms)
-        return encoded
+        key = self.keyring.signing_key()
+        return jwt.encode(
+            payload_copy,
+            key.private_key,
+            algorithm=key.algorithm,
+            headers={"kid": key.kid}
+        )
 
     def decode(self, token: str) -> Dict[str, Any]:
         token = token.replace(self.token_type, '').strip()
-        payload = jwt.decode(token, self.key, algorithms=[self.algorithms])
-        return payload
+        return self.verify(token)
+
+    def verification_keys(self, token: str) -> List[JwtKey]:
+        """
+        Keys that may have signed `token`, picked by its `kid` header.
+        Tokens without `kid` predate key rotation and are HMAC tokens signed
+        with the current or a retired secret.
+        """
+        kid = jwt.get_unverified_header(token).get('kid')
+        if kid is None:
+            keys = self.keyring.legacy_keys()
+            if not keys:
+                raise jwt.InvalidTokenError("Symmetric tokens are not accepted")
+            return keys
+        key = self.keyring.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown key id '{kid}'")
+        return [key]
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """
+        Validate a raw token (without the `Bearer` prefix) and return its claims.
+
+        Signature and expiry are checked once per token; repeated calls are
+        served from `verified_tokens` until the token expires. Raises
+        `jwt.InvalidTokenError` when the token is not valid.
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        claims = verified_tokens.get(digest)
+        if claims is None:
+            error = None
+            for key in self.verification_keys(token):
+                try:
+                    claims = jwt.decode(
+                        token,
+                        key.public_key,
+                        algorithms=[key.algorithm],
+                        options={"require": ["exp"]}
+                    )
+                    break
+                except jwt.InvalidSignatureError as e:
+                    error = e
+            if claims is None:
+                raise error
+            verified_tokens.set(digest, claims, claims['exp'])
+        return dict(claims)
 
     def get_tokens(self, payload: Dict[str, Any]) -> Dict[str, str]:
         token = self.encode(payload, self.token_lifetime)
@@ -39,8 +347,7 @@ class JwtHelper:
 
     def check(self, token: str) -> bool:
         try:
-            payload = self.decode(token)
-            return epoch_now() <= payload['exp']
-        except (jwt.InvalidSignatureError, jwt.DecodeError, jwt.ExpiredSignatureError, KeyError):
+            self.decode(token)
+            return True
+        except jwt.InvalidTokenError:
             return False
-
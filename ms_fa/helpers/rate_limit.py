@@ -0,0 +1,153 @@
+import ipaddress
+import logging
+from typing import List, Optional, Sequence, Tuple, Union
+from fastapi import HTTPException, Request, status
+from redis.exceptions import RedisError
+
+from ms_fa.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_KEY_PREFIX = "ms-users:rate-limit"
+
+# Token buckets, one per key. ARGV holds `capacity, period_ms` for each key;
+# a bucket refills completely over its period. A token is taken from every
+# bucket only when all of them have one, so a rejected request costs
+# nothing. Returns 0 when allowed, otherwise the milliseconds to wait.
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local retry = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local period = tonumber(ARGV[i * 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * capacity / period)
+    if tokens < 1 then
+        retry = math.max(retry, math.ceil((1 - tokens) * period / capacity))
+    end
+    levels[i] = tokens
+end
+if retry == 0 then
+    for i, key in ipairs(KEYS) do
+        redis.call('HSET', key, 'tokens', tostring(levels[i] - 1), 'ts', now)
+        redis.call('PEXPIRE', key, ARGV[i * 2])
+    end
+end
+return retry
+"""
+
+
+class RateLimit:
+    """`capacity` requests per `period` seconds for one identifier, e.g. a username."""
+
+    def __init__(self, name: str, capacity: int, period: int = 60) -> None:
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+
+    def __repr__(self):
+        return f"<rate_limit {self.name} {self.capacity}/{self.period}s>"
+
+    def key(self, identifier: str) -> str:
+        return f"{RATE_LIMIT_KEY_PREFIX}:{self.name}:{identifier.strip().lower()}"
+
+
+def parse_networks(value: str) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip()]
+
+
+trusted_proxies = parse_networks(settings.TRUSTED_PROXIES)
+
+
+def is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+def client_ip(request: Request) -> str:
+    """
+    Address of the client. Behind trusted proxies this is the right-most
+    X-Forwarded-For hop they did not add themselves; hops further left are
+    supplied by the client and cannot be trusted.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not is_trusted_proxy(peer):
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+def consume(cache, limits: Sequence[Tuple[RateLimit, Optional[str]]]) -> int:
+    """
+    Take one token from each `(limit, identifier)` bucket in a single
+    atomic script call. Returns 0 when allowed, otherwise the number of
+    milliseconds until a retry can succeed.
+    """
+    keys, args = [], []
+    for limit, identifier in limits:
+        if not identifier or limit.capacity <= 0:
+            continue
+        keys.append(limit.key(identifier))
+        args.extend([limit.capacity, limit.period * 1000])
+    if not keys:
+        return 0
+    return int(cache.script(TOKEN_BUCKET_SCRIPT)(keys=keys, args=args))
+
+
+def throttle(request: Request, *limits: Tuple[RateLimit, Optional[str]]) -> None:
+    """
+    Reject the request with 429 when any of `limits` is exhausted.
+
+    Runs before any expensive work (hashing, notifications). When the
+    cache is unavailable requests are let through rather than failing.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    cache = getattr(request.app.state, 'cache', None)
+    if cache is None:
+        return
+    try:
+        retry_ms = consume(cache, limits)
+    except RedisError as e:
+        logger.warning("Rate limit check failed: %s", e)
+        return
+    if retry_ms > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, try again later",
+            headers={"Retry-After": str(-(-retry_ms // 1000))},
+        )
+
+
+login_by_username = RateLimit(
+    "login:username", settings.RATE_LIMIT_LOGIN_PER_USERNAME, settings.RATE_LIMIT_PERIOD
+)
+login_by_ip = RateLimit(
+    "login:ip", settings.RATE_LIMIT_LOGIN_PER_IP, settings.RATE_LIMIT_PERIOD
+)
+notification_by_username = RateLimit(
+    "notification:username", settings.RATE_LIMIT_NOTIFICATION_PER_USERNAME, settings.RATE_LIMIT_PERIOD
+)
+notification_by_ip = RateLimit(
+    "notification:ip", settings.RATE_LIMIT_NOTIFICATION_PER_IP, settings.RATE_LIMIT_PERIOD
+)
+reset_token_by_username = RateLimit(
+    "reset-token:username", settings.RATE_LIMIT_RESET_TOKEN_PER_USERNAME, settings.RATE_LIMIT_PERIOD
+)
+reset_token_by_ip = RateLimit(
+    "reset-token:ip", settings.RATE_LIMIT_RESET_TOKEN_PER_IP, settings.RATE_LIMIT_PERIOD
+)
+reset_token_by_token = RateLimit(
+    "reset-token:token", settings.RATE_LIMIT_RESET_TOKEN_PER_TOKEN, settings.RATE_LIMIT_PERIOD
+)
@@ -0,0 +1,111 @@
+import logging
+import threading
+from typing import Dict, Optional
+
+from ms_fa.helpers.time import epoch_now
+
+
+logger = logging.getLogger(__name__)
+
+REVOKED_SESSIONS_KEY = "ms-users:revoked-sessions"
+REVOKED_SESSIONS_CHANNEL = "ms-users:revoked-sessions"
+
+
+class RevocationList:
+    """
+    Sessions revoked before their tokens expire (e.g. on logout).
+
+    Redis holds the shared list as a sorted set scored by expiry, so
+    entries age out once their tokens could no longer be used anyway.
+    Every worker mirrors it into a local dict, kept current through
+    pub/sub, so `is_revoked` never leaves the process. The list is loaded
+    once each (re)subscription is confirmed, so nothing published while
+    loading or while disconnected is missed.
+    """
+
+    def __init__(self) -> None:
+        self._revoked: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def is_revoked(self, session: Optional[str]) -> bool:
+        if not session:
+            return False
+        exp = self._revoked.get(session)
+        return exp is not None and exp > epoch_now()
+
+    def revoke(self, cache, session: str, exp: int) -> None:
+        self._add(session, exp)
+        if cache is None:
+            return
+        pipe = cache.conn.pipeline()
+        pipe.zadd(REVOKED_SESSIONS_KEY, {session: exp})
+        pipe.zremrangebyscore(REVOKED_SESSIONS_KEY, "-inf", epoch_now())
+        pipe.publish(REVOKED_SESSIONS_CHANNEL, f"{session}:{exp}")
+        pipe.execute()
+
+    def sync(self, cache) -> None:
+        entries = cache.conn.zrangebyscore(
+            REVOKED_SESSIONS_KEY, epoch_now(), "+inf", withscores=True
+        )
+        revoked = {session.decode(): int(exp) for session, exp in entries}
+        now = epoch_now()
+        with self._lock:
+            # Keep local revocations made while the list was being read
+            revoked.update((s, e) for s, e in self._revoked.items() if e > now)
+            self._revoked = revoked
+
+    def start(self, cache) -> None:
+        """Follow revocations published by other workers, in a background thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._listen, args=(cache,), name="revocation-list", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _listen(self, cache) -> None:
+        # Redis being down (also at startup) only delays the first load;
+        # the loop keeps resubscribing and reloads once it is back.
+        while not self._stop.is_set():
+            pubsub = cache.conn.pubsub()
+            try:
+                pubsub.subscribe(REVOKED_SESSIONS_CHANNEL)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message["type"] == "subscribe":
+                        self.sync(cache)
+                    elif message["type"] == "message":
+                        session, _, exp = message["data"].decode().rpartition(":")
+                        self._add(session, int(exp))
+            except Exception as e:
+                logger.warning("Revocation list subscription failed: %s", e)
+                self._stop.wait(1)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+    def _add(self, session: str, exp: int) -> None:
+        now = epoch_now()
+        with self._lock:
+            self._revoked[session] = exp
+            if len(self._revoked) % 1000 == 0:
+                self._revoked = {s: e for s, e in self._revoked.items() if e > now}
+
+
+revocations = RevocationList()
@@ -0,0 +1,37 @@
+from typing import Any, Optional
+
+from ms_fa.helpers.authz import authz
+
+
+# Cache namespace shared by user and app snapshots (`ms-users:{generation}:{id}`).
+SNAPSHOT_NAMESPACE = "ms-users"
+
+# Profile columns carried by user snapshots.
+PROFILE_FIELDS = ("payment_capacity", "second_credit", "available_credit")
+
+
+def user_snapshot(id: str, email: str, profile: Any, grants: Any, version: Optional[int]) -> dict:
+    """
+    Cache snapshot of a user. `profile` is anything with the
+    `PROFILE_FIELDS` attributes (a `Profile` or a result row), or None;
+    `grants` is a `Grants` tuple.
+    """
+    return authz.stamp({
+        "id": id,
+        "kind": "user",
+        "email": email,
+        "permissions": sorted(grants.permissions),
+        "roles": sorted(grants.roles),
+        "profile": None if profile is None else {
+            field: getattr(profile, field) for field in PROFILE_FIELDS
+        },
+    }, version)
+
+
+def app_snapshot(id: str, grants: Any, version: Optional[int]) -> dict:
+    return authz.stamp({
+        "id": id,
+        "kind": "app",
+        "permissions": sorted(grants.permissions),
+        "roles": sorted(grants.roles),
+    }, version)
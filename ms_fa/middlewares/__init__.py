@@ -1,11 +1,18 @@
-from .auth import get_current_user, AuthPayload
+from .auth import get_current_user, AuthPayload, resolve_principals, resolve_principal_async
+from .principal import Principal
 from .permissions import require_permissions
 from .roles import require_roles
+from .route_authz import RouteAuthzMiddleware, route_table
 
 __all__ = [
     "get_current_user",
     "AuthPayload",
+    "resolve_principals",
+    "resolve_principal_async",
+    "Principal",
     "require_permissions",
     "require_roles",
+    "RouteAuthzMiddleware",
+    "route_table",
 ]
 
@@ -1,23 +1,195 @@
-from typing import Optional, Any
+import jwt
+from typing import Optional, Any, Callable, Dict, List
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from ms_fa.db import get_db
+from ms_fa.db import get_async_db
+from ms_fa.helpers.authz import authz
 from ms_fa.helpers.jwt import JwtHelper
+from ms_fa.helpers.revocation import revocations
+from ms_fa.helpers.snapshot import PROFILE_FIELDS, SNAPSHOT_NAMESPACE, app_snapshot, user_snapshot
+from ms_fa.middlewares.principal import Principal
+from ms_fa.middlewares.route_authz import verified_claims
+from ms_fa.models import User, App, Profile
 from ms_fa.repositories import UserRepository, AppRepository
+from ms_fa.repositories.permission_repository import Grants, collect_grants
 
 
 security = HTTPBearer()
 
 
+def entity_loader(id: str, kind: Optional[str]) -> Callable[[Session], Any]:
+    # Tokens and snapshots issued before the `kind` claim existed leave it
+    # unset; those fall back to trying the user table, then the app table.
+    def load(db: Session):
+        entity = None
+        if kind != "app":
+            entity = UserRepository(db).find(id, fail=False)
+        if entity is None and kind != "user":
+            entity = AppRepository(db).find(id, fail=False)
+        return entity
+
+    return load
+
+
+def build_principal(
+    id: str,
+    snapshot: Optional[dict],
+    user_repo: UserRepository,
+    app_repo: AppRepository,
+    kind: Optional[str] = None
+) -> Optional[Principal]:
+    kind = (snapshot.get("kind") if snapshot else None) or kind
+    load = entity_loader(id, kind)
+
+    if snapshot is not None:
+        return Principal(snapshot, load)
+
+    entity = load(user_repo.db)
+    if entity is None:
+        return None
+
+    if isinstance(entity, User):
+        snapshot = user_repo.setCache(entity, force=True) or user_repo.snapshot(entity)
+    else:
+        snapshot = app_repo.setCache(entity) or app_repo.snapshot(entity)
+
+    return Principal(snapshot, load, entity)
+
+
+def resolve_principals(
+    ids: List[str],
+    db: Session,
+    cache=None,
+    kinds: Optional[Dict[str, str]] = None
+) -> Dict[str, Optional[Principal]]:
+    """
+    Resolve several token subjects, fetching their snapshots in one pipeline.
+    `kinds` maps subject ids to the `kind` claim of their token.
+    """
+    kinds = kinds or {}
+    user_repo = UserRepository(db, cache)
+    app_repo = AppRepository(db, cache)
+    ids = list(dict.fromkeys(ids))
+    if cache is not None:
+        snapshots = cache.get_hashes(user_repo.cache_keys(ids))
+    else:
+        snapshots = [None] * len(ids)
+    return {
+        id: build_principal(id, snapshot, user_repo, app_repo, kinds.get(id))
+        for id, snapshot in zip(ids, snapshots)
+    }
+
+
+async def _load_grants(db: AsyncSession, model: type, id: str) -> Grants:
+    rows = await db.execute(model.grants_query([id]))
+    return collect_grants(rows, [id])[id]
+
+
+async def load_snapshot(
+    id: str,
+    db: AsyncSession,
+    kind: Optional[str] = None,
+    cache=None
+) -> Optional[dict]:
+    """
+    Build the cache snapshot of a user or app with plain column
+    queries, the async counterpart of `UserRepository.snapshot` and
+    `AppRepository.snapshot`. Returns None when the subject does not exist.
+    The authz version is read through `cache`, an `AsyncCache`, before the
+    grants, so the snapshot is always stamped.
+    """
+    version = await authz.current_version_async(cache)
+    if kind != "app":
+        row = (await db.execute(
+            select(
+                User.id,
+                User.email,
+                Profile.id.label("profile_id"),
+                *(getattr(Profile, field) for field in PROFILE_FIELDS)
+            )
+            .outerjoin(Profile, Profile.user_id == User.id)
+            .where(User.id == id, User.deleted_at.is_(None))
+        )).first()
+        if row is not None:
+            grants = await _load_grants(db, User, id)
+            profile = row if row.profile_id is not None else None
+            return user_snapshot(row.id, row.email, profile, grants, version)
+
+    if kind != "user":
+        app_id = (await db.execute(select(App.id).where(App.id == id))).scalar()
+        if app_id is not None:
+            grants = await _load_grants(db, App, id)
+            return app_snapshot(app_id, grants, version)
+
+    return None
+
+
+async def resolve_principal_async(
+    id: str,
+    async_db: AsyncSession,
+    cache=None,
+    kind: Optional[str] = None
+) -> Optional[Principal]:
+    """
+    Resolve the token subject from its cache snapshot without blocking the
+    event loop: the snapshot is read from an `AsyncCache` and rebuilt with
+    `async_db` on a miss, then written back so the next request takes the
+    fast path. Handlers that need the ORM entity load it with
+    `Principal.load`.
+    """
+    key = snapshot = None
+    if cache is not None:
+        key = await cache.namespace_prefix(SNAPSHOT_NAMESPACE) + id
+        snapshot = await cache.get_hash(key)
+
+    if snapshot is None:
+        snapshot = await load_snapshot(id, async_db, kind, cache)
+        if snapshot is None:
+            return None
+        if cache is not None:
+            await cache.set_hash(key, snapshot)
+
+    kind = snapshot.get("kind") or kind
+    return Principal(snapshot, entity_loader(id, kind))
+
+
+async def current_principal(auth: "AuthPayload", version: int, async_db: AsyncSession, cache=None) -> Principal:
+    """
+    The principal of `auth` as of authz `version`. A snapshot stamped under
+    another version may predate a role or permission change (the member
+    refresh runs later, in the worker), so it is rebuilt from the database
+    and written back instead of being trusted.
+    """
+    principal = auth.user
+    if principal.authz_version == version:
+        return principal
+
+    snapshot = await load_snapshot(auth.id, async_db, principal.kind, cache)
+    if snapshot is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if cache is not None:
+        key = await cache.namespace_prefix(SNAPSHOT_NAMESPACE) + auth.id
+        await cache.set_hash(key, snapshot)
+    auth.user = Principal(snapshot, entity_loader(auth.id, snapshot.get("kind")))
+    return auth.user
+
+
 class AuthPayload(BaseModel):
     id: str
     aq_id: Optional[int] = None
     session: Optional[str] = None
     exp: int
     user: Any = None
+    claims: dict = {}
 
     class Config:
         arbitrary_types_allowed = True
@@ -26,65 +198,62 @@ class AuthPayload(BaseModel):
 async def get_current_user(
     request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    async_db: AsyncSession = Depends(get_async_db)
 ) -> AuthPayload:
     """
     Dependency to get the current authenticated user from JWT token.
     """
-    token = credentials.credentials
     jwt_helper = JwtHelper()
     
-    # Validate token
-    if not jwt_helper.check(f"Bearer {token}"):
+    # Validate and decode token, unless the route authz middleware already did
+    payload = verified_claims(request, credentials.credentials)
+    if payload is None:
+        try:
+            payload = jwt_helper.verify(credentials.credentials)
+        except jwt.InvalidTokenError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    
+    if revocations.is_revoked(payload.get('session')):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
+            detail="Token has been revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Decode token
-    try:
-        payload = jwt_helper.decode(f"Bearer {token}")
-    except Exception:
+    # Get cache from app state
+    cache = getattr(request.app.state, 'async_cache', None)
+
+    principal = await resolve_principal_async(
+        payload.get('id'), async_db, cache, payload.get('kind')
+    )
+
+    if principal is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
+            detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Get cache from app state
-    cache = getattr(request.app.state, 'cache', None)
-    
-    # Find user or app
-    user_repo = UserRepository(db, cache)
-    app_repo = AppRepository(db, cache)
-    
-    entity = user_repo.find(payload.get('id'), fail=False)
-    
-    if not entity:
-        entity = app_repo.find(payload.get('id'), fail=False)
-        if not entity:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    
     auth_payload = AuthPayload(
         id=payload.get('id'),
         aq_id=payload.get('aq_id'),
         session=payload.get('session'),
         exp=payload.get('exp'),
-        user=entity
+        user=principal,
+        claims=payload
     )
     
     return auth_payload
 
 
-def get_optional_user(
+async def get_optional_user(
     request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
-    db: Session = Depends(get_db)
+    async_db: AsyncSession = Depends(get_async_db)
 ) -> Optional[AuthPayload]:
     """
     Optional dependency to get the current authenticated user.
@@ -94,7 +263,7 @@ def get_optional_user(
         return None
     
     try:
-        return get_current_user(request, credentials, db)
+        return await get_current_user(request, credentials, async_db)
     except HTTPException:
         return None
 
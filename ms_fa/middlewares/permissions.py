@@ -1,37 +1,60 @@
-from typing import Tuple
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ms_fa.middlewares.auth import get_current_user, AuthPayload
+from ms_fa.db import get_async_db
+from ms_fa.helpers.authz import authz, decode_bitset
+from ms_fa.middlewares.auth import get_current_user, current_principal, AuthPayload
+
+
+def forbidden() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="You don't have permission to access this resource"
+    )
 
 
 def require_permissions(*permissions: str):
     """
     Dependency factory to require specific permissions.
-    
+
+    The names are compiled into a bitmask once, when the route is declared,
+    so a check is a single AND against the token or snapshot mask.
+
     Usage:
         @router.get("/endpoint")
         async def endpoint(auth: AuthPayload = Depends(require_permissions("User - list", "User - detail"))):
             ...
     """
+    required = authz.compile(permissions)
+
     async def permission_checker(
-        auth: AuthPayload = Depends(get_current_user)
+        request: Request,
+        auth: AuthPayload = Depends(get_current_user),
+        async_db: AsyncSession = Depends(get_async_db)
     ) -> AuthPayload:
-        user = auth.user
-        
+        claims = auth.claims
+        cache = getattr(request.app.state, 'async_cache', None)
+        version = await authz.current_version_async(cache)
+
+        # Trust the token bitset while its authz stamp is still current
+        if "perms" in claims and claims.get("azv") == version:
+            if "root" in claims.get("roles", []):
+                return auth
+            if required.allows(decode_bitset(claims["perms"])):
+                return auth
+            raise forbidden()
+
+        # Otherwise the snapshot, rebuilt first if its stamp is stale too
+        principal = await current_principal(auth, version, async_db, cache)
+
         # Root users have all permissions
-        if user.roles.filter_by(name="root").count() > 0:
+        if "root" in principal.role_set:
             return auth
-        
-        # Check if user has any of the required permissions
-        user_permissions = [p.name for p in user.all_permissions]
-        for permission in permissions:
-            if permission in user_permissions:
-                return auth
-        
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You don't have permission to access this resource"
-        )
-    
-    return permission_checker
 
+        if principal.mask is not None and required.allows(principal.mask):
+            return auth
+
+        raise forbidden()
+
+    permission_checker.permissions = required
+    return permission_checker
@@ -0,0 +1,94 @@
+from typing import Any, Callable, FrozenSet, List, Optional
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ms_fa.helpers.authz import decode_bitset
+
+
+class Principal:
+    """
+    Authenticated user or app backed by its `ms-users:{generation}:{id}` cache snapshot.
+
+    Fields present in the snapshot are served from memory. Any other
+    attribute is read from the ORM entity, which handlers load first with
+    `await principal.load(db)`.
+    """
+
+    _fields = ("id", "email")
+
+    def __init__(self, snapshot: dict, loader: Callable[[Session], Any], entity: Any = None):
+        self._snapshot = snapshot
+        self._loader = loader
+        self._entity = entity
+        self._mask = None
+        self._role_set = None
+
+    def __repr__(self):
+        return f"<principal id={self._snapshot.get('id')} kind={self.kind}>"
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in self._fields and name in self._snapshot:
+            return self._snapshot[name]
+        return getattr(self.entity, name)
+
+    @property
+    def snapshot(self) -> dict:
+        return self._snapshot
+
+    @property
+    def kind(self) -> Optional[str]:
+        return self._snapshot.get("kind")
+
+    @property
+    def role_names(self) -> List[str]:
+        return self._snapshot.get("roles") or []
+
+    @property
+    def role_set(self) -> FrozenSet[str]:
+        """Role names for membership checks; read from the entity only for snapshots without roles."""
+        if self._role_set is None:
+            roles = self._snapshot.get("roles")
+            if roles is None:
+                roles = self.entity.roles_list
+            self._role_set = frozenset(roles)
+        return self._role_set
+
+    @property
+    def permission_names(self) -> List[str]:
+        return self._snapshot.get("permissions") or []
+
+    @property
+    def mask(self) -> Optional[int]:
+        """Permission bitmask of the snapshot, None for snapshots built without one."""
+        if self._mask is None and "mask" in self._snapshot:
+            self._mask = decode_bitset(self._snapshot["mask"])
+        return self._mask
+
+    @property
+    def authz_version(self) -> Optional[int]:
+        return self._snapshot.get("azv")
+
+    @property
+    def entity(self) -> Any:
+        if self._entity is None:
+            raise RuntimeError("The entity is not loaded, await Principal.load(db) first")
+        return self._entity
+
+    async def load(self, db: Session) -> Any:
+        """
+        The ORM entity of the principal, attached to `db`. It is looked up
+        in the thread pool on first use, so the event loop never waits on
+        the synchronous session.
+        """
+        if self._entity is None:
+            self._entity = await run_in_threadpool(self._loader, db)
+            if self._entity is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="User not found",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+        return self._entity
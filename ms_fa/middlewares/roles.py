@@ -1,9 +1,24 @@
-from typing import Tuple
-from fastapi import Depends, HTTPException, status
-from sqlalchemy import or_
+from typing import FrozenSet
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ms_fa.models import Role
-from ms_fa.middlewares.auth import get_current_user, AuthPayload
+from ms_fa.db import get_async_db
+from ms_fa.helpers.authz import authz
+from ms_fa.middlewares.auth import get_current_user, current_principal, AuthPayload
+
+
+async def principal_roles(auth: AuthPayload, async_db: AsyncSession, cache=None) -> FrozenSet[str]:
+    """
+    Role names of the authenticated principal: from the token while its
+    authz stamp is current, otherwise from the principal snapshot, rebuilt
+    first when its stamp is stale as well. `cache` is an `AsyncCache`.
+    """
+    claims = auth.claims
+    version = await authz.current_version_async(cache)
+    if "roles" in claims and claims.get("azv") == version:
+        return frozenset(claims["roles"])
+    principal = await current_principal(auth, version, async_db, cache)
+    return principal.role_set
 
 
 def require_roles(*roles: str):
@@ -15,18 +30,21 @@ def require_roles(*roles: str):
         async def endpoint(auth: AuthPayload = Depends(require_roles("root", "admin"))):
             ...
     """
+    required = frozenset(roles)
+
     async def role_checker(
-        auth: AuthPayload = Depends(get_current_user)
+        request: Request,
+        auth: AuthPayload = Depends(get_current_user),
+        async_db: AsyncSession = Depends(get_async_db)
     ) -> AuthPayload:
-        user = auth.user
+        names = await principal_roles(auth, async_db, getattr(request.app.state, 'async_cache', None))
         
         # Root users have all access
-        if user.roles.filter_by(name="root").count() > 0:
+        if "root" in names:
             return auth
         
         # Check if user has any of the required roles
-        filters = [Role.name == role for role in roles]
-        if user.roles.filter(or_(*filters)).count() > 0:
+        if not names.isdisjoint(required):
             return auth
         
         raise HTTPException(
@@ -34,5 +52,5 @@ def require_roles(*roles: str):
             detail="You don't have the required role to access this resource"
         )
     
+    role_checker.roles = required
     return role_checker
-
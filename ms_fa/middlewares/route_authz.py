@@ -0,0 +1,186 @@
+import jwt
+import logging
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from fastapi import FastAPI
+from fastapi.dependencies.models import Dependant
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ms_fa.helpers.authz import PermissionMask, authz, decode_bitset
+from ms_fa.helpers.jwt import JwtHelper
+from ms_fa.helpers.revocation import revocations
+
+
+logger = logging.getLogger(__name__)
+
+
+class RouteRequirement:
+    """
+    What a route demands of the caller, gathered from its
+    `require_permissions` and `require_roles` dependencies. Every mask and
+    every role set must be satisfied; root satisfies all of them.
+    """
+
+    def __init__(self, route: APIRoute) -> None:
+        self.route = route
+        self.masks: List[PermissionMask] = []
+        self.roles: List[FrozenSet[str]] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.masks or self.roles)
+
+    def allows(self, roles: FrozenSet[str], mask: int) -> bool:
+        if "root" in roles:
+            return True
+        return (
+            all(required.allows(mask) for required in self.masks)
+            and all(not roles.isdisjoint(required) for required in self.roles)
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "path": self.route.path,
+            "methods": sorted(self.route.methods or []),
+            "name": self.route.name,
+            "permissions": [list(required.names) for required in self.masks],
+            "masks": [required.value for required in self.masks],
+            "roles": [sorted(required) for required in self.roles],
+        }
+
+
+class RouteTable:
+    """
+    Authorization requirements of every API route, compiled once at
+    startup by walking the dependency tree of each route.
+    """
+
+    def __init__(self) -> None:
+        self.app: Optional[FastAPI] = None
+        self.requirements: Dict[int, RouteRequirement] = {}
+
+    def compile(self, app: FastAPI) -> None:
+        requirements = {}
+        for route in app.router.routes:
+            if not isinstance(route, APIRoute):
+                continue
+            requirement = RouteRequirement(route)
+            self._collect(route.dependant, requirement)
+            if requirement:
+                requirements[id(route)] = requirement
+        self.requirements = requirements
+        self.app = app
+        logger.info("Compiled authorization requirements for %d routes", len(requirements))
+
+    def _collect(self, dependant: Dependant, requirement: RouteRequirement) -> None:
+        for dependency in dependant.dependencies:
+            permissions = getattr(dependency.call, "permissions", None)
+            if isinstance(permissions, PermissionMask):
+                requirement.masks.append(permissions)
+            roles = getattr(dependency.call, "roles", None)
+            if isinstance(roles, frozenset):
+                requirement.roles.append(roles)
+            self._collect(dependency, requirement)
+
+    def match(self, scope: Scope) -> Optional[RouteRequirement]:
+        """Requirement of the route the router will dispatch `scope` to, if any."""
+        if self.app is None:
+            return None
+        for route in self.app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return self.requirements.get(id(route))
+        return None
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [requirement.describe() for requirement in self.requirements.values()]
+
+
+route_table = RouteTable()
+
+
+def bearer_token(scope: Scope) -> Optional[str]:
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token.strip():
+                return token.strip()
+            return None
+    return None
+
+
+class RouteAuthzMiddleware:
+    """
+    Rejects requests that `route_table` can already tell are unauthorized,
+    before routing and dependency injection run.
+
+    Decisions are made from the token alone: invalid or revoked tokens get
+    401, and tokens whose role and permission claims carry a current authz
+    stamp get 403 when they miss the route's requirement. Anything it cannot
+    decide (no token, tokens without claims, stale stamps) goes through to
+    the route dependencies, which remain the authoritative check. Verified
+    claims are left in `request.state` so `get_current_user` does not
+    verify the token again.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.jwt_helper = JwtHelper()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requirement = route_table.match(scope)
+        token = bearer_token(scope) if requirement else None
+        if token is None:
+            await self.app(scope, receive, send)
+            return
+
+        response = await self.check(scope, requirement, token)
+        if response is not None:
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    async def check(self, scope: Scope, requirement: RouteRequirement, token: str) -> Optional[JSONResponse]:
+        try:
+            claims = await run_in_threadpool(self.jwt_helper.verify, token)
+        except jwt.InvalidTokenError:
+            return unauthorized("Invalid or expired token")
+        if revocations.is_revoked(claims.get("session")):
+            return unauthorized("Token has been revoked")
+        scope.setdefault("state", {})["token_claims"] = (token, claims)
+
+        if "perms" not in claims or "roles" not in claims:
+            return None
+        cache = getattr(scope["app"].state, "async_cache", None)
+        if not await authz.is_current_async(claims.get("azv"), cache):
+            return None
+        if requirement.allows(frozenset(claims["roles"]), decode_bitset(claims["perms"])):
+            return None
+
+        detail = (
+            "You don't have permission to access this resource" if requirement.masks
+            else "You don't have the required role to access this resource"
+        )
+        return JSONResponse({"detail": detail}, status_code=403)
+
+
+def unauthorized(detail: str) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=401,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def verified_claims(request, token: str) -> Optional[Dict[str, Any]]:
+    """Claims verified by `RouteAuthzMiddleware` for `token` in this request."""
+    stashed: Optional[Tuple[str, dict]] = getattr(request.state, "token_claims", None)
+    if stashed is not None and stashed[0] == token:
+        return dict(stashed[1])
+    return None
@@ -1,12 +1,12 @@
 import uuid
-from typing import List
 from sqlalchemy import Column, String
 from sqlalchemy.orm import relationship
 from ms_fa.models.base import Model
 from ms_fa.models.association_tables import app_permission_table, app_role_table
+from ms_fa.models.grants import HasGrants
 
 
-class App(Model):
+class App(Model, HasGrants):
     __tablename__ = 'app'
 
     _fillable = ['name', 'description']
@@ -43,27 +43,4 @@ class App(Model):
         passive_deletes=True
     )
 
-    @property
-    def roles_permissions(self) -> List:
-        permissions = list()
-        roles = self.roles.all()
-        for role in roles:
-            permissions = list(set(permissions + role.permissions.all()))
-        return permissions
-
-    @property
-    def all_permissions(self) -> List:
-        permissions = self.permissions.all() or list()
-        for p in self.roles_permissions:
-            if p not in permissions:
-                permissions.append(p)
-        return permissions
-
-    @property
-    def roles_list(self) -> List[str]:
-        roles = self.roles.all()
-        roles_list = list()
-        for role in roles:
-            roles_list.append(role.name)
-        return roles_list
-
+    grant_tables = (app_permission_table, app_role_table, "app_id")
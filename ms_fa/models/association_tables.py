@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, ForeignKey
+from sqlalchemy import Table, Column, ForeignKey, Index
 from ms_fa.db import Base
 
 
@@ -21,6 +21,7 @@ user_role_table = Table(
     Base.metadata,
     Column('user_id', ForeignKey('user.id', ondelete='CASCADE')),
     Column('role_id', ForeignKey('role.id')),
+    Index('ix_user_has_roles_role_id', 'role_id'),
 )
 
 app_permission_table = Table(
@@ -35,5 +36,6 @@ app_role_table = Table(
     Base.metadata,
     Column('app_id', ForeignKey('app.id', ondelete='CASCADE')),
     Column('role_id', ForeignKey('role.id')),
+    Index('ix_app_has_roles_role_id', 'role_id'),
 )
 
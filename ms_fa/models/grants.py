@@ -0,0 +1,82 @@
+from typing import ClassVar, List, Sequence, Tuple
+from sqlalchemy import Table, literal, select, union
+from sqlalchemy.orm import object_session
+
+from ms_fa.models.association_tables import permission_role_table
+from ms_fa.models.permission import Permission
+from ms_fa.models.role import Role
+
+
+class HasGrants:
+    """
+    Roles and permissions granted to a principal (`User` or `App`), either
+    directly or through its roles.
+
+    Subclasses must set `grant_tables` to their association tables as
+    `(permission table, role table, principal id column)`. The query
+    builders take many principal ids so the same statement serves one
+    principal or a batch, with a sync or an async session.
+    """
+
+    grant_tables: ClassVar[Tuple[Table, Table, str]]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not isinstance(getattr(cls, "grant_tables", None), tuple):
+            raise TypeError(f"{cls.__name__} must define grant_tables")
+
+    @classmethod
+    def roles_query(cls, ids: Sequence[str]):
+        _, role_table, column = cls.grant_tables
+        owner = role_table.c[column]
+        return (
+            select(owner.label("owner_id"), Role.name)
+            .join(role_table, role_table.c.role_id == Role.id)
+            .where(owner.in_(ids))
+        )
+
+    @classmethod
+    def permissions_query(cls, ids: Sequence[str], inherited_only: bool = False):
+        """UNION of direct and role permissions as `(owner_id, permission_id, name)` rows."""
+        permission_table, role_table, column = cls.grant_tables
+        inherited = (
+            select(role_table.c[column].label("owner_id"), Permission.id, Permission.name)
+            .join(permission_role_table, permission_role_table.c.permission_id == Permission.id)
+            .join(role_table, role_table.c.role_id == permission_role_table.c.role_id)
+            .where(role_table.c[column].in_(ids))
+        )
+        if inherited_only:
+            return inherited
+        direct = (
+            select(permission_table.c[column].label("owner_id"), Permission.id, Permission.name)
+            .join(permission_table, permission_table.c.permission_id == Permission.id)
+            .where(permission_table.c[column].in_(ids))
+        )
+        return union(direct, inherited)
+
+    @classmethod
+    def grants_query(cls, ids: Sequence[str]):
+        """Roles and effective permissions as `(owner_id, type, name)` rows, in one statement."""
+        roles = cls.roles_query(ids).subquery()
+        permissions = cls.permissions_query(ids).subquery()
+        return union(
+            select(roles.c.owner_id, literal("role").label("type"), roles.c.name),
+            select(permissions.c.owner_id, literal("permission").label("type"), permissions.c.name),
+        )
+
+    def _permissions(self, inherited_only: bool = False) -> List[Permission]:
+        ids = select(self.permissions_query([self.id], inherited_only).subquery().c.id)
+        return object_session(self).query(Permission).filter(Permission.id.in_(ids)).all()
+
+    @property
+    def roles_permissions(self) -> List[Permission]:
+        return self._permissions(inherited_only=True)
+
+    @property
+    def all_permissions(self) -> List[Permission]:
+        return self._permissions()
+
+    @property
+    def roles_list(self) -> List[str]:
+        rows = object_session(self).execute(self.roles_query([self.id]))
+        return [name for _, name in rows]
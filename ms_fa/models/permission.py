@@ -1,5 +1,6 @@
 import uuid
-from sqlalchemy import Column, String, Boolean
+from sqlalchemy import Column, String, Boolean, Integer, event, func, select
+from sqlalchemy.orm import Session
 from ms_fa.models.base import Model
 
 
@@ -23,7 +24,28 @@ class Permission(Model):
         default=True,
         nullable=False
     )
+    # Dense, stable bit position of the permission in token bitsets.
+    ordinal = Column(
+        Integer,
+        unique=True,
+        nullable=False
+    )
 
     def __repr__(self):
         return f"<permission id={self.id} name={self.name}>"
 
+
+@event.listens_for(Session, "before_flush")
+def assign_permission_ordinals(session, flush_context, instances):
+    pending = sorted(
+        (obj for obj in session.new if isinstance(obj, Permission) and obj.ordinal is None),
+        key=lambda p: p.name
+    )
+    if not pending:
+        return
+    with session.no_autoflush:
+        current = session.execute(select(func.max(Permission.ordinal))).scalar()
+    next_ordinal = 0 if current is None else current + 1
+    for permission in pending:
+        permission.ordinal = next_ordinal
+        next_ordinal += 1
@@ -1,11 +1,15 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from ms_fa.models.base import Model
 
 
 class Session(Model):
     __tablename__ = 'session'
+    __table_args__ = (
+        Index('ix_session_user_id_updated_at', 'user_id', 'updated_at'),
+        Index('ix_session_token', 'token'),
+    )
 
     _fillable = [
         "user_id",
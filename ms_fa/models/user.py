@@ -1,15 +1,16 @@
 import datetime
 import uuid
-from typing import List, Optional
+from typing import Optional, Tuple
 from sqlalchemy import Column, String, Boolean, Integer, DateTime
 from sqlalchemy.orm import relationship
-from passlib.hash import pbkdf2_sha256
+from ms_fa.helpers.hash import get_password_hash, verify_password, verify_and_update_password
 
 from ms_fa.models.base import Model
 from ms_fa.models.association_tables import user_permission_table, user_role_table
+from ms_fa.models.grants import HasGrants
 
 
-class User(Model):
+class User(Model, HasGrants):
     __tablename__ = "user"
 
     _default_role = "shopper"
@@ -66,37 +67,21 @@ class User(Model):
     def __repr__(self):
         return f"<user id={self.id} email={self.email} phone={self.phone}>"
 
+    grant_tables = (user_permission_table, user_role_table, "user_id")
+
     @property
     def fullname(self) -> str:
         return f"{self.name} {self.lastname} {self.second_lastname}"
 
+    @staticmethod
+    def hash_password(password: str) -> str:
+        return get_password_hash(password)
+
     def set_password(self, password: str) -> None:
-        self.password = pbkdf2_sha256.using(rounds=100000, salt_size=12).hash(password)
+        self.password = self.hash_password(password)
 
     def verify_password(self, password: str) -> bool:
-        return pbkdf2_sha256.verify(password, self.password)
-
-    @property
-    def roles_permissions(self) -> List:
-        permissions = list()
-        roles = self.roles.all()
-        for role in roles:
-            permissions = list(set(permissions + role.permissions.all()))
-        return permissions
-
-    @property
-    def all_permissions(self) -> List:
-        permissions = self.permissions.all() or list()
-        for p in self.roles_permissions:
-            if p not in permissions:
-                permissions.append(p)
-        return permissions
-
-    @property
-    def roles_list(self) -> List[str]:
-        roles = self.roles.all()
-        roles_list = list()
-        for role in roles:
-            roles_list.append(role.name)
-        return roles_list
+        return verify_password(password, self.password)
 
+    def verify_and_update_password(self, password: str) -> Tuple[bool, Optional[str]]:
+        return verify_and_update_password(password, self.password)
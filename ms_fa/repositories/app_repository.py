@@ -1,8 +1,11 @@
-from typing import Optional, List
+from typing import Dict, Optional, List
 from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
-from ms_fa.models import App
+from ms_fa.helpers.authz import authz
+from ms_fa.helpers.snapshot import SNAPSHOT_NAMESPACE, app_snapshot
+from ms_fa.models import App, Permission, Role
+from ms_fa.models.association_tables import app_permission_table, app_role_table
 from ms_fa.repositories.repository import Repository
 
 
@@ -10,7 +13,7 @@ class AppRepository(Repository[App]):
     def __init__(self, db: Session, cache=None):
         super().__init__(db)
         self.cache = cache
-        self.cache_key_prefix = "ms-users-"
+        self.cache_namespace = SNAPSHOT_NAMESPACE
 
     def get_model(self) -> type:
         return App
@@ -47,39 +50,72 @@ class AppRepository(Repository[App]):
         self.db_save(app)
 
     def sync_permissions(self, id: str, permissions: List[str]):
-        from ms_fa.repositories import PermissionRepository
-        
-        permissionRepo = PermissionRepository(self.db)
         app = self.find(id)
-        app.permissions = list()
-        for permission_id in permissions:
-            permission = permissionRepo.find(permission_id)
-            app.permissions.append(permission)
-        self.db_save(app)
+        self.db_sync_association(
+            app_permission_table, "app_id", app.id, "permission_id", Permission, permissions
+        )
+        authz.bump(self.cache)
         self.setCache(app)
 
     def sync_roles(self, id: str, roles: List[str]):
         from ms_fa.repositories import RoleRepository
         
-        roleRepo = RoleRepository(self.db)
         app = self.find(id)
-        app.roles = list()
-        for role_id in roles:
-            role = roleRepo.find(role_id)
-            app.roles.append(role)
-        self.db_save(app)
+        added, removed = self.db_sync_association(
+            app_role_table, "app_id", app.id, "role_id", Role, roles
+        )
+        RoleRepository(self.db, self.cache).track_members("app", app.id, added=added, removed=removed)
+        authz.bump(self.cache)
         self.setCache(app)
 
-    def setCache(self, app: App):
+    def delete(self, id: str, fail: bool = True) -> Optional[App]:
+        app = self.find(id, fail=fail)
+        if app is not None:
+            from ms_fa.repositories import RoleRepository
+
+            removed = [role.id for role in app.roles]
+            self.db_delete(app)
+            RoleRepository(self.db, self.cache).track_members("app", app.id, removed=removed)
+            # Snapshots never expire; a deleted app must not keep authenticating
+            if self.cache is not None:
+                self.cache.delete(self.cache_key(app.id))
+        return app
+
+    def cache_key(self, id: str) -> str:
+        return self.cache_keys([id])[0]
+
+    def cache_keys(self, ids: List[str]) -> List[str]:
+        prefix = self.cache.namespace_prefix(self.cache_namespace)
+        return [f"{prefix}{id}" for id in ids]
+
+    def snapshot(self, app: App) -> dict:
+        return self.snapshots([app.id])[app.id]
+
+    def snapshots(self, ids: List[str]) -> Dict[str, dict]:
+        """Snapshots of many apps, with their grants loaded in a single query."""
+        from ms_fa.repositories import PermissionRepository
+
+        version = authz.current_version(self.cache) if self.cache is not None else None
+        grants = PermissionRepository(self.db).grants(App, ids)
+        return {id: app_snapshot(id, grants[id], version) for id in ids}
+
+    def setCache(self, app: App) -> Optional[dict]:
         if self.cache is None:
-            return
-            
-        key = f"{self.cache_key_prefix}{app.id}"
-        permissions = [p.name for p in app.all_permissions]
-        data = {
-            "id": app.id,
-            "permissions": permissions,
-            "roles": app.roles_list,
-        }
-        self.cache.set(key, data)
+            return None
+
+        data = self.snapshot(app)
+        self.cache.set_hash(self.cache_key(app.id), data)
+        return data
 
+    def refresh_snapshots(self, ids: List[str]) -> int:
+        """Rebuild the cached snapshots among `ids`; apps not in the cache are skipped."""
+        if self.cache is None or not ids:
+            return 0
+        keys = self.cache_keys(ids)
+        cached = [id for id, exists in zip(ids, self.cache.exists_many(keys)) if exists]
+        if not cached:
+            return 0
+        found = [id for id, in self.db.query(self._model.id).filter(self._model.id.in_(cached))]
+        snapshots = self.snapshots(found)
+        self.cache.set_hashes(dict(zip(self.cache_keys(list(snapshots)), snapshots.values())))
+        return len(snapshots)
@@ -1,14 +1,37 @@
-from typing import Optional, Tuple
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional, Sequence, Tuple
 from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from ms_fa.helpers.authz import authz
 from ms_fa.models import Permission
 from ms_fa.repositories.repository import Repository
 
 
+# Ordinals are allocated as max + 1 when the permission is flushed, so two
+# concurrent creates can pick the same one; the unique constraint rejects
+# the second, which retries with the next ordinal.
+ORDINAL_ATTEMPTS = 5
+
+
+class Grants(NamedTuple):
+    roles: FrozenSet[str]
+    permissions: FrozenSet[str]
+
+
+def collect_grants(rows: Iterable[tuple], ids: Sequence[str]) -> Dict[str, Grants]:
+    """Group `HasGrants.grants_query` rows by principal; ids without grants get empty sets."""
+    roles = {id: set() for id in ids}
+    permissions = {id: set() for id in ids}
+    for owner_id, type, name in rows:
+        (roles if type == "role" else permissions)[owner_id].add(name)
+    return {id: Grants(frozenset(roles[id]), frozenset(permissions[id])) for id in ids}
+
+
 class PermissionRepository(Repository[Permission]):
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, cache=None):
         super().__init__(db)
+        self.cache = cache
 
     def get_model(self) -> type:
         return Permission
@@ -40,12 +63,48 @@ class PermissionRepository(Repository[Permission]):
             return self._paginate(q, page, per_page)
         return q.all()
 
+    def grants(self, model: type, ids: Sequence[str]) -> Dict[str, Grants]:
+        """
+        Role names and effective permission names of several users or apps
+        (`model` is `User` or `App`), resolved with a single query.
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        return collect_grants(self.db.execute(model.grants_query(ids)), ids)
+
+    def add(self, data: dict) -> Permission:
+        for attempt in range(ORDINAL_ATTEMPTS):
+            try:
+                permission = super().add(data)
+                break
+            except IntegrityError as e:
+                if "ordinal" not in str(e.orig) or attempt == ORDINAL_ATTEMPTS - 1:
+                    raise
+        authz.bump(self.cache)
+        return permission
+
+    def update(self, id: str, data: dict, fail: bool = True) -> Optional[Permission]:
+        permission = super().update(id, data, fail=fail)
+        if permission is not None:
+            authz.bump(self.cache)
+            self.truncate_snapshots()
+        return permission
+
     def delete(self, id: str, fail: bool = True) -> Tuple[Optional[Permission], bool]:
         permission = self.find(id, fail=fail)
         if permission is not None:
             if permission.fixed:
                 return permission, False
             self.db_delete(permission)
+            authz.bump(self.cache)
+            self.truncate_snapshots()
             return permission, True
         return permission, False
 
+    def truncate_snapshots(self) -> None:
+        # Renamed or deleted permissions may be held by any snapshot
+        from ms_fa.repositories.user_repository import UserRepository
+
+        UserRepository(self.db, self.cache).truncateCache()
+
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Any, List, Optional, TypeVar, Generic
-from sqlalchemy import or_
+from typing import Any, Iterable, List, Optional, Set, Tuple, TypeVar, Generic
+from sqlalchemy import Table, delete, insert, or_, select
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 
@@ -44,6 +44,47 @@ class Repository(ABC, Generic[T]):
     def rollback(self) -> None:
         self.db.rollback()
 
+    def db_sync_association(
+        self,
+        table: Table,
+        owner_column: str,
+        owner_id: str,
+        target_column: str,
+        target_model: type,
+        ids: Iterable[str]
+    ) -> Tuple[Set[str], Set[str]]:
+        """
+        Make the `table` rows of `owner_id` point at exactly `ids`.
+
+        All ids are validated with one query, then only the difference with
+        the current rows is written: one DELETE and one multi-row INSERT in
+        a single transaction. Returns the `(added, removed)` ids.
+        """
+        wanted = set(ids)
+        if wanted:
+            found = self.db.execute(
+                select(target_model.id).where(target_model.id.in_(wanted))
+            ).scalars().all()
+            if len(found) != len(wanted):
+                raise HTTPException(status_code=404, detail="Resource not found")
+
+        owner = table.c[owner_column]
+        target = table.c[target_column]
+        current = set(self.db.execute(select(target).where(owner == owner_id)).scalars())
+        added, removed = wanted - current, current - wanted
+        try:
+            if removed:
+                self.db.execute(delete(table).where(owner == owner_id, target.in_(removed)))
+            if added:
+                self.db.execute(insert(table).values([
+                    {owner_column: owner_id, target_column: id} for id in added
+                ]))
+            self.db.commit()
+        except Exception as e:
+            self.rollback()
+            raise e
+        return added, removed
+
     def add(self, data: dict) -> T:
         model = self._model(data)
         self.db_save(model)
@@ -1,14 +1,47 @@
-from typing import Optional, Tuple, List
-from sqlalchemy import or_
+from typing import Dict, Iterable, Iterator, Optional, Tuple, List
+from sqlalchemy import or_, select
 from sqlalchemy.orm import Session
 
-from ms_fa.models import Role
+from ms_fa.config import settings
+from ms_fa.helpers.authz import authz
+from ms_fa.models import Permission, Role
+from ms_fa.models.association_tables import app_role_table, permission_role_table, user_role_table
 from ms_fa.repositories.repository import Repository
 
 
+ROLE_MEMBERS_KEY_PREFIX = "ms-users:role-members"
+
+# Marks an index as built, so a role without members is not rebuilt on every read
+ROLE_MEMBERS_MARKER = "*"
+
+# Membership changes are applied only to indexes that already exist; a
+# missing index is rebuilt from the database on its next read instead.
+# ARGV[1] is the member, followed by one `+`/`-` per key.
+TRACK_MEMBERS_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        if ARGV[i + 1] == '+' then
+            redis.call('SADD', key, ARGV[1])
+        else
+            redis.call('SREM', key, ARGV[1])
+        end
+    end
+end
+return 0
+"""
+
+
 class RoleRepository(Repository[Role]):
-    def __init__(self, db: Session):
+    """
+    Besides the `role` table, keeps a reverse index from each role to its
+    members in Redis (`ms-users:role-members:{role_id}`, entries
+    `user:{id}` / `app:{id}`) so the snapshots of everyone holding a role
+    can be refreshed when the role changes.
+    """
+
+    def __init__(self, db: Session, cache=None):
         super().__init__(db)
+        self.cache = cache
 
     def get_model(self) -> type:
         return Role
@@ -47,25 +80,121 @@ class RoleRepository(Repository[Role]):
                 return role, False
             role.update(data)
             self.db_save(role)
+            authz.bump(self.cache)
+            if "name" in data:
+                # Snapshots carry role names
+                self.enqueue_refresh(role.id)
         return role, True
 
     def sync_permissions(self, id: str, permissions: List[str]):
-        from ms_fa.repositories import PermissionRepository
-        
-        permissionRepo = PermissionRepository(self.db)
         role = self.find(id)
-        role.permissions = list()
-        for permission_id in permissions:
-            permission = permissionRepo.find(permission_id)
-            role.permissions.append(permission)
-        self.db_save(role)
+        self.db_sync_association(
+            permission_role_table, "role_id", role.id, "permission_id", Permission, permissions
+        )
+        authz.bump(self.cache)
+        self.enqueue_refresh(role.id)
 
     def delete(self, id: str, fail: bool = True) -> Tuple[Optional[Role], bool]:
         role = self.find(id, fail=fail)
         if role is not None:
             if role.fixed:
                 return role, False
+            # Build the index first: the association rows go with the role
+            self.ensure_members_index(role.id)
             self.db_delete(role)
+            authz.bump(self.cache)
+            self.enqueue_refresh(role.id, drop_index=True)
             return role, True
         return role, False
 
+    def members_key(self, role_id: str) -> str:
+        return f"{ROLE_MEMBERS_KEY_PREFIX}:{role_id}"
+
+    def ensure_members_index(self, role_id: str) -> bool:
+        """Build the member index of a role from the database when it is missing."""
+        if self.cache is None:
+            return False
+        key = self.members_key(role_id)
+        if self.cache.exists(key):
+            return True
+        users = select(user_role_table.c.user_id).where(user_role_table.c.role_id == role_id)
+        apps = select(app_role_table.c.app_id).where(app_role_table.c.role_id == role_id)
+        members = [f"user:{id}" for id, in self.db.execute(users)]
+        members += [f"app:{id}" for id, in self.db.execute(apps)]
+        pipe = self.cache.conn.pipeline()
+        pipe.sadd(key, ROLE_MEMBERS_MARKER)
+        for start in range(0, len(members), self.cache.chunk_size):
+            pipe.sadd(key, *members[start:start + self.cache.chunk_size])
+        pipe.execute()
+        return True
+
+    def track_members(
+        self,
+        kind: str,
+        principal_id: str,
+        added: Iterable[str] = (),
+        removed: Iterable[str] = ()
+    ) -> None:
+        """Record that a user or app gained `added` and lost `removed` role ids."""
+        if self.cache is None:
+            return
+        keys, args = [], [f"{kind}:{principal_id}"]
+        for role_ids, op in ((added, "+"), (removed, "-")):
+            for role_id in role_ids:
+                keys.append(self.members_key(role_id))
+                args.append(op)
+        if keys:
+            self.cache.script(TRACK_MEMBERS_SCRIPT)(keys=keys, args=args)
+
+    def member_batches(self, role_id: str, batch_size: int) -> Iterator[Dict[str, List[str]]]:
+        """Members of a role as `{"user": [...], "app": [...]}` batches of about `batch_size`."""
+        self.ensure_members_index(role_id)
+        for members in self._scan_members(self.members_key(role_id), batch_size):
+            batch = {"user": [], "app": []}
+            for member in members:
+                kind, _, id = member.decode().partition(":")
+                if kind in batch:
+                    batch[kind].append(id)
+            yield batch
+
+    def _scan_members(self, key: str, batch_size: int) -> Iterator[list]:
+        cursor = None
+        while cursor != 0:
+            cursor, members = self.cache.conn.sscan(key, cursor=cursor or 0, count=batch_size)
+            if members:
+                yield members
+
+    def enqueue_refresh(self, role_id: str, drop_index: bool = False) -> None:
+        """
+        Hand `refresh_members` to the worker, so a role with many members
+        does not hold the request. Until it runs, members keep their
+        previous snapshot. With `drop_index`, the task removes the member
+        index when it is done.
+        """
+        if self.cache is None:
+            return
+        from ms_fa.tasks.refresh_role_members import refresh_role_members_task
+
+        refresh_role_members_task.delay(role_id, drop_index)
+
+    def refresh_members(self, role_id: str, batch_size: Optional[int] = None) -> int:
+        """
+        Rebuild the cached snapshots of every user and app holding a role,
+        batch by batch, after the role changed. Each batch costs one
+        existence check, two queries and one write pipeline, and members
+        without a cached snapshot are skipped. Returns the number of
+        snapshots written.
+        """
+        from ms_fa.repositories import AppRepository, UserRepository
+
+        if self.cache is None:
+            return 0
+        batch_size = batch_size or settings.ROLE_MEMBERS_BATCH_SIZE
+        user_repo = UserRepository(self.db, self.cache)
+        app_repo = AppRepository(self.db, self.cache)
+        refreshed = 0
+        for batch in self.member_batches(role_id, batch_size):
+            refreshed += user_repo.refresh_snapshots(batch["user"])
+            refreshed += app_repo.refresh_snapshots(batch["app"])
+        return refreshed
+
@@ -1,18 +1,143 @@
 import datetime
-from typing import Optional, List
-from sqlalchemy.orm import Session as DBSession
+from typing import Optional, List, Tuple
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.orm import Session as DBSession, joinedload
 
+from ms_fa.config import settings
+from ms_fa.helpers.revocation import revocations
+from ms_fa.helpers.time import datetime_to_epoch, epoch_now
 from ms_fa.models import Session, User
 from ms_fa.repositories.repository import Repository
 
 
 class SessionRepository(Repository[Session]):
-    def __init__(self, db: DBSession):
+    def __init__(self, db: DBSession, cache=None):
         super().__init__(db)
+        self.cache = cache
+        self.rotated_key_prefix = "ms-users:rotated-session:"
 
     def get_model(self) -> type:
         return Session
 
+    def open(self, user_id: str, token: str, expires_at: datetime.datetime) -> None:
+        """
+        Insert a login session without reading the row back. Expired
+        sessions of the user are dropped, and so are the least recently
+        used ones beyond `SESSION_MAX_PER_USER`.
+        """
+        try:
+            limit = settings.SESSION_MAX_PER_USER
+            evicted = self.prune(user_id, keep=limit - 1 if limit > 0 else None)
+            self.db.add(self._model({
+                "user_id": user_id,
+                "token": token,
+                "expires_at": expires_at,
+            }))
+            self.db.commit()
+        except Exception as e:
+            self.rollback()
+            raise e
+        # Only once the eviction is committed; a rollback keeps them alive
+        for evicted_token, exp in evicted:
+            revocations.revoke(self.cache, evicted_token, exp)
+
+    def prune(self, user_id: str, keep: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Delete expired sessions and, unless `keep` is None, all but the
+        `keep` most recently used ones, without committing. Returns the
+        `(token, exp)` of the evicted sessions that are still live, which
+        the caller revokes after committing.
+        """
+        now = datetime.datetime.utcnow()
+        stale = self._model.expires_at <= now
+        if keep is not None:
+            recent = (
+                select(self._model.id)
+                .where(self._model.user_id == user_id, self._model.expires_at > now)
+                .order_by(self._model.updated_at.desc())
+                .limit(max(keep, 0))
+            )
+            stale = or_(stale, self._model.id.not_in(recent))
+        evicted = self.db.execute(
+            delete(self._model)
+            .where(self._model.user_id == user_id, stale)
+            .returning(self._model.token, self._model.expires_at)
+            .execution_options(synchronize_session=False)
+        ).all()
+        now = epoch_now()
+        live = [(token, datetime_to_epoch(expires_at)) for token, expires_at in evicted]
+        return [(token, exp) for token, exp in live if exp > now]
+
+    def find_by_token(self, user, token: str) -> Optional[Session]:
+        user_id = user.id if isinstance(user, User) else user
+        return self.db.query(self._model).filter_by(user_id=user_id, token=token).first()
+
+    def rotate(self, session: Session, token: str, expires_at: datetime.datetime) -> Optional[Session]:
+        """
+        Replace the token of `session` in place on refresh. The old token is
+        revoked and mapped to the new one, so a later reuse can be traced to
+        the session it was rotated into.
+
+        The swap only applies while the session still holds the old token.
+        When a concurrent refresh of the same token got there first, the
+        token was used twice: the whole family is revoked and None returned.
+        """
+        old_token = session.token
+        old_exp = datetime_to_epoch(session.expires_at)
+        try:
+            result = self.db.execute(
+                update(self._model)
+                .where(self._model.id == session.id, self._model.token == old_token)
+                .values(token=token, expires_at=expires_at)
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+        except Exception as e:
+            self.rollback()
+            raise e
+        if result.rowcount == 0:
+            self.revoke_family(old_token, session_id=session.id)
+            return None
+        self.db.expire(session)
+        if self.cache is not None and old_exp > epoch_now():
+            self.cache.set(
+                self.rotated_key(old_token),
+                {"session": token, "rotated_at": epoch_now()},
+                exp=old_exp - epoch_now()
+            )
+        revocations.revoke(self.cache, old_token, old_exp)
+        return session
+
+    def rotated_key(self, token: str) -> str:
+        return f"{self.rotated_key_prefix}{token}"
+
+    def rotated(self, token: Optional[str]) -> Optional[dict]:
+        """Rotation record of a replaced session token, or None if it was never rotated."""
+        if self.cache is None or not token:
+            return None
+        return self.cache.get(self.rotated_key(token))
+
+    def revoke_family(self, token: str, session_id: Optional[str] = None) -> Optional[Session]:
+        """
+        Follow the rotations of `token` to the live session and end it.
+        Used when an already rotated refresh token is presented again.
+        `session_id` finds the session when the rotation is not recorded yet.
+        """
+        seen = set()
+        while token not in seen:
+            seen.add(token)
+            rotated = self.rotated(token)
+            if rotated is None:
+                break
+            token = rotated["session"]
+        session = self.db.query(self._model).filter_by(token=token).first()
+        if session is None and session_id is not None:
+            session = self.db.query(self._model).filter_by(id=session_id).first()
+        if session:
+            revocations.revoke(self.cache, session.token, datetime_to_epoch(session.expires_at))
+            self.db_delete(session)
+        return session
+
     def delete(self, user, token: str) -> Optional[Session]:
         user_id = user.id if isinstance(user, User) else user
         session = self.db.query(self._model).filter_by(
@@ -34,12 +159,10 @@ class SessionRepository(Repository[Session]):
 
     def get_users_with_active_session(self) -> List[User]:
         now = datetime.datetime.utcnow()
-        sessions = self.db.query(self._model).filter(
-            self._model.expires_at > now
-        ).all()
-        users = []
-        for session in sessions:
-            if session.user not in users:
-                users.append(session.user)
-        return users
-
+        active = select(self._model.user_id).where(self._model.expires_at > now)
+        return (
+            self.db.query(User)
+            .options(joinedload(User.profile))
+            .filter(User.id.in_(active))
+            .all()
+        )
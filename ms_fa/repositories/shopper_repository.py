@@ -70,11 +70,12 @@ class ShopperRepository(Repository[User]):
         if user.profile:
             user.profile.second_credit = second_credit
             self.db_save(user)
+            self.userRepo.updateCacheProfile(user, ["second_credit"])
         else:
             user.profile = Profile()
             user.profile.second_credit = second_credit
             self.db_save(user.profile)
-        self.userRepo.setCache(user)
+            self.userRepo.setCache(user)
         return user
 
     def update_payment(self, id, data: dict) -> User:
@@ -83,12 +84,13 @@ class ShopperRepository(Repository[User]):
             user.profile.available_credit = data.get("available_credit", 0)
             user.profile.payment_capacity = data.get("payment_capacity", 0)
             self.db_save(user)
+            self.userRepo.updateCacheProfile(user, ["available_credit", "payment_capacity"])
         else:
             user.profile = Profile()
             user.profile.available_credit = data.get("available_credit", 0)
             user.profile.payment_capacity = data.get("payment_capacity", 0)
             self.db_save(user.profile)
-        self.userRepo.setCache(user)
+            self.userRepo.setCache(user)
         return user
 
     def update_available_credit(self, id, data: dict) -> User:
@@ -96,11 +98,12 @@ class ShopperRepository(Repository[User]):
         if user.profile:
             user.profile.available_credit = data.get("available_credit", 0)
             self.db_save(user)
+            self.userRepo.updateCacheProfile(user, ["available_credit"])
         else:
             user.profile = Profile()
             user.profile.available_credit = data.get("available_credit", 0)
             self.db_save(user.profile)
-        self.userRepo.setCache(user)
+            self.userRepo.setCache(user)
         return user
 
     def update_payment_capacity(self, id, data: dict) -> User:
@@ -108,11 +111,12 @@ class ShopperRepository(Repository[User]):
         if user.profile:
             user.profile.payment_capacity = data.get("payment_capacity", 0)
             self.db_save(user)
+            self.userRepo.updateCacheProfile(user, ["payment_capacity"])
         else:
             user.profile = Profile()
             user.profile.payment_capacity = data.get("payment_capacity", 0)
             self.db_save(user.profile)
-        self.userRepo.setCache(user)
+            self.userRepo.setCache(user)
         return user
 
     def update_kyc_prescoring(self, id, kyc_prescoring_id: int) -> User:
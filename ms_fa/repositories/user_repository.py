@@ -1,10 +1,13 @@
 import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 from sqlalchemy import or_
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from fastapi import HTTPException
 
-from ms_fa.models import User, Profile
+from ms_fa.helpers.authz import authz
+from ms_fa.helpers.snapshot import SNAPSHOT_NAMESPACE, user_snapshot
+from ms_fa.models import User, Permission, Profile, Role
+from ms_fa.models.association_tables import user_permission_table, user_role_table
 from ms_fa.repositories.repository import Repository
 
 
@@ -13,7 +16,7 @@ class UserRepository(Repository[User]):
         super().__init__(db)
         self.cache = cache
         self.rootRole = "root"
-        self.cache_key_prefix = "ms-users-"
+        self.cache_namespace = SNAPSHOT_NAMESPACE
 
     def get_model(self) -> type:
         return User
@@ -28,13 +31,17 @@ class UserRepository(Repository[User]):
         user = self._model(data)
         user.roles.append(role)
         
-        if "password" in data:
+        if "password_hash" in data:
+            user.new_pass = True
+            user.password = data["password_hash"]
+        elif "password" in data:
             user.new_pass = True
             user.set_password(data["password"])
         else:
             return None
         
         self.db_save(user)
+        RoleRepository(self.db, self.cache).track_members("user", user.id, added=[role.id])
         return user
 
     def all(
@@ -106,6 +113,24 @@ class UserRepository(Repository[User]):
             raise HTTPException(status_code=404, detail="User not found")
         return result
 
+    def find_by_username(self, username: str, fail: bool = True) -> Optional[User]:
+        """
+        Look up a user by phone or email for login, loading the profile in
+        the same query since the token and snapshot both need it.
+        """
+        q = (
+            self.db.query(self._model)
+            .options(joinedload(self._model.profile))
+            .filter(
+                or_(self._model.phone == username, self._model.email == username),
+                self._model.deleted_at.is_(None)
+            )
+        )
+        result = q.first()
+        if fail and result is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return result
+
     def find_by_phone_and_email(self, phone: str, email: str, fail: bool = True, with_deleted: bool = False) -> Optional[User]:
         filters = {"phone": phone, "email": email}
         if not with_deleted:
@@ -116,14 +141,24 @@ class UserRepository(Repository[User]):
             raise HTTPException(status_code=404, detail="User not found")
         return result
 
-    def update_password(self, id, password: str, fail: bool = True) -> User:
+    def update_password(self, id, password: str, fail: bool = True, password_hash: Optional[str] = None) -> User:
+        """`password_hash` skips hashing when the caller already did it off the event loop."""
         user = self.find(id, fail)
         if user is not None:
             user.new_pass = True
-            user.set_password(password)
+            if password_hash is not None:
+                user.password = password_hash
+            else:
+                user.set_password(password)
             self.db_save(user)
         return user
 
+    def rehash_password(self, user: User, password_hash: str) -> User:
+        """Store a hash upgraded to the current policy; the password itself is unchanged."""
+        user.password = password_hash
+        self.db_save(user)
+        return user
+
     def update_available_credit(self, id, amount: float):
         user = id if isinstance(id, self._model) else self.find(id)
         user.profile.available_credit = amount
@@ -140,27 +175,22 @@ class UserRepository(Repository[User]):
         self.db_save(user)
 
     def sync_permissions(self, id: str, permissions: List[str]):
-        from ms_fa.repositories import PermissionRepository
-        
-        permissionRepo = PermissionRepository(self.db)
         user = self.find(id)
-        user.permissions = list()
-        for permission_id in permissions:
-            permission = permissionRepo.find(permission_id)
-            user.permissions.append(permission)
-        self.db_save(user)
+        self.db_sync_association(
+            user_permission_table, "user_id", user.id, "permission_id", Permission, permissions
+        )
+        authz.bump(self.cache)
         self.setCache(user)
 
     def sync_roles(self, id: str, roles: List[str]):
         from ms_fa.repositories import RoleRepository
         
-        roleRepo = RoleRepository(self.db)
         user = self.find(id)
-        user.roles = list()
-        for role_id in roles:
-            role = roleRepo.find(role_id)
-            user.roles.append(role)
-        self.db_save(user)
+        added, removed = self.db_sync_association(
+            user_role_table, "user_id", user.id, "role_id", Role, roles
+        )
+        RoleRepository(self.db, self.cache).track_members("user", user.id, added=added, removed=removed)
+        authz.bump(self.cache)
         self.setCache(user)
 
     def activate(self, id: str, fail: bool = True) -> User:
@@ -197,10 +227,14 @@ class UserRepository(Repository[User]):
     def delete(self, id: str, fail: bool = True) -> User:
         user = self.find(id, fail=fail, with_deleted=True)
         if user is not None:
+            from ms_fa.repositories import RoleRepository
+
             self.canBeDeleted(user)
+            removed = [role.id for role in user.roles]
             user.permissions = list()
             user.roles = list()
             self.db_delete(user)
+            RoleRepository(self.db, self.cache).track_members("user", user.id, removed=removed)
             self.deleteCache(user)
         return user
 
@@ -208,35 +242,83 @@ class UserRepository(Repository[User]):
         if self.rootRole in user.roles_list:
             raise HTTPException(status_code=403, detail="You can't delete root user")
 
-    def setCache(self, user: User, force: bool = False):
+    def cache_key(self, id: str) -> str:
+        return self.cache_keys([id])[0]
+
+    def cache_keys(self, ids: List[str]) -> List[str]:
+        prefix = self.cache.namespace_prefix(self.cache_namespace)
+        return [f"{prefix}{id}" for id in ids]
+
+    def snapshot(self, user: User) -> dict:
+        return self.snapshots([user])[user.id]
+
+    def snapshots(self, users: List[User]) -> Dict[str, dict]:
+        """Snapshots of many users, with their grants loaded in a single query."""
+        from ms_fa.repositories import PermissionRepository
+
+        version = authz.current_version(self.cache) if self.cache is not None else None
+        grants = PermissionRepository(self.db).grants(User, [user.id for user in users])
+        return {
+            user.id: user_snapshot(
+                user.id, user.email, getattr(user, "profile", None), grants[user.id], version
+            )
+            for user in users
+        }
+
+    def setCache(self, user: User, force: bool = False, data: Optional[dict] = None) -> Optional[dict]:
         if self.cache is None:
-            return
-            
-        key = f"{self.cache_key_prefix}{user.id}"
+            return None
+
+        key = self.cache_key(user.id)
 
         if not self.cache.exists(key) and not force:
-            return
+            return None
 
-        permissions = [p.name for p in user.all_permissions]
-        data = {
-            "id": user.id,
-            "email": user.email,
-            "permissions": permissions,
-            "roles": user.roles_list,
-            "profile": None,
-        }
+        data = data or self.snapshot(user)
+        self.cache.set_hash(key, data)
+        return data
 
-        if hasattr(user, "profile") and user.profile is not None:
-            data["profile"] = {
-                "payment_capacity": user.profile.payment_capacity,
-                "second_credit": user.profile.second_credit,
-                "available_credit": user.profile.available_credit,
-            }
+    def updateCacheProfile(self, user: User, fields: List[str]) -> None:
+        """
+        Write only the given profile fields into the cached snapshot. A
+        snapshot cached without a profile is rebuilt with `setCache`.
+        """
+        if self.cache is None or user.profile is None:
+            return
+        values = {f"profile.{field}": getattr(user.profile, field) for field in fields}
+        if not self.cache.update_hash(self.cache_key(user.id), values, if_field=f"profile.{fields[0]}"):
+            self.setCache(user)
 
-        self.cache.set(key, data)
+    def refresh_snapshots(self, ids: List[str]) -> int:
+        """
+        Rebuild the cached snapshots among `ids`, e.g. after a role they
+        hold changed. Users without a cached snapshot are skipped, as
+        `setCache` does. Returns the number of snapshots written.
+        """
+        if self.cache is None or not ids:
+            return 0
+        keys = self.cache_keys(ids)
+        cached = [id for id, exists in zip(ids, self.cache.exists_many(keys)) if exists]
+        if not cached:
+            return 0
+        users = (
+            self.db.query(self._model)
+            .options(joinedload(self._model.profile))
+            .filter(self._model.id.in_(cached), self._model.deleted_at.is_(None))
+            .all()
+        )
+        snapshots = self.snapshots(users)
+        self.cache.set_hashes(dict(zip(self.cache_keys(list(snapshots)), snapshots.values())))
+        return len(snapshots)
 
     def deleteCache(self, user: User):
         if self.cache is None:
             return
-        self.cache.delete(f"{self.cache_key_prefix}{user.id}")
+        self.cache.delete(self.cache_key(user.id))
+
+    def truncateCache(self):
+        """Drop the cached snapshots of every user and app at once."""
+        if self.cache is None:
+            return
+        self.cache.truncate(self.cache_namespace)
 
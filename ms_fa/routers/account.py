@@ -3,7 +3,9 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from ms_fa.db import get_db
+from ms_fa.helpers.hash import hash_pool
 from ms_fa.middlewares import get_current_user, AuthPayload, require_permissions
+from ms_fa.models import User
 from ms_fa.repositories import UserRepository, ShopperRepository, DeviceRepository
 from ms_fa.schemas.user import (
     AccountUpdateRequest,
@@ -87,9 +89,11 @@ def serialize_profile(profile):
 
 @router.get("")
 async def get_profile(
-    auth: AuthPayload = Depends(get_current_user)
+    auth: AuthPayload = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
-    return serialize_user_profile(auth.user)
+    user = await auth.user.load(db)
+    return serialize_user_profile(user)
 
 
 @router.put("")
@@ -101,7 +105,7 @@ async def update_profile(
 ):
     cache = getattr(request.app.state, 'cache', None)
     shopper_repo = ShopperRepository(db, cache)
-    user = shopper_repo.update(auth.user, data.model_dump(exclude_unset=True))
+    user = shopper_repo.update(await auth.user.load(db), data.model_dump(exclude_unset=True))
     return serialize_user_profile(user)
 
 
@@ -114,7 +118,7 @@ async def patch_profile(
 ):
     cache = getattr(request.app.state, 'cache', None)
     shopper_repo = ShopperRepository(db, cache)
-    user = shopper_repo.update(auth.user, data.model_dump(exclude_unset=True))
+    user = shopper_repo.update(await auth.user.load(db), data.model_dump(exclude_unset=True))
     return serialize_user_profile(user)
 
 
@@ -151,25 +155,30 @@ async def update_password(
     db: Session = Depends(get_db)
 ):
     user_repo = UserRepository(db)
-    user_repo.update_password(auth.user.id, data.password)
+    password_hash = await hash_pool.run(User.hash_password, data.password)
+    user_repo.update_password(auth.user.id, data.password, password_hash=password_hash)
     return None
 
 
 @router.get("/permissions")
 async def get_permissions(
-    auth: AuthPayload = Depends(get_current_user)
+    auth: AuthPayload = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
+    user = await auth.user.load(db)
     permissions = [
         {"id": p.id, "name": p.name, "fixed": p.fixed, "created_at": datetime_to_epoch(p.created_at)}
-        for p in auth.user.all_permissions
+        for p in user.all_permissions
     ]
     return permissions
 
 
 @router.get("/devices")
 async def get_devices(
-    auth: AuthPayload = Depends(get_current_user)
+    auth: AuthPayload = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
+    user = await auth.user.load(db)
     devices = [
         {
             "id": d.id,
@@ -182,7 +191,7 @@ async def get_devices(
             "app_version": d.app_version,
             "created_at": datetime_to_epoch(d.created_at),
         }
-        for d in auth.user.devices
+        for d in user.devices
     ]
     return devices
 
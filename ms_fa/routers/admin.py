@@ -3,7 +3,9 @@ from sqlalchemy.orm import Session
 from typing import Optional
 
 from ms_fa.db import get_db
+from ms_fa.helpers.hash import hash_pool
 from ms_fa.middlewares import AuthPayload, require_permissions
+from ms_fa.models import User
 from ms_fa.repositories import UserRepository
 from ms_fa.schemas.user import (
     UserCreateRequest,
@@ -110,7 +112,9 @@ async def create_user(
 ):
     cache = getattr(request.app.state, 'cache', None)
     user_repo = UserRepository(db, cache)
-    user = user_repo.add(data.model_dump())
+    data = data.model_dump()
+    data["password_hash"] = await hash_pool.run(User.hash_password, data["password"])
+    user = user_repo.add(data)
     return serialize_user(user)
 
 
@@ -156,7 +160,8 @@ async def update_user_password(
     db: Session = Depends(get_db)
 ):
     user_repo = UserRepository(db)
-    user_repo.update_password(id, data.password)
+    password_hash = await hash_pool.run(User.hash_password, data.password)
+    user_repo.update_password(id, data.password, password_hash=password_hash)
     return None
 
 
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.orm import Session
 
 from ms_fa.config import settings
 from ms_fa.db import get_db, db_ping
 from ms_fa.helpers.files import s3_ping
+from ms_fa.helpers.jwt import jwks
 from ms_fa.middlewares import get_current_user, AuthPayload
 
 from ms_fa.routers.auth import router as auth_router
@@ -54,3 +55,9 @@ async def api_status(
         }
     }
 
+
+
+@api_router.get("/.well-known/jwks.json")
+async def api_jwks(response: Response):
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return jwks()
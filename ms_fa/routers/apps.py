@@ -5,7 +5,7 @@ from typing import Optional
 from ms_fa.db import get_db
 from ms_fa.middlewares import AuthPayload, require_permissions
 from ms_fa.repositories import AppRepository
-from ms_fa.helpers.jwt import JwtHelper
+from ms_fa.helpers.jwt import JwtHelper, TOKEN_VERSION
 from ms_fa.schemas.app import (
     AppCreateRequest,
     AppUpdateRequest,
@@ -92,7 +92,7 @@ async def generate_app_token(
     app_repo = AppRepository(db, cache)
     
     app = app_repo.find(id)
-    payload = {"id": app.id}
+    payload = {"id": app.id, "kind": "app", "ver": TOKEN_VERSION}
     token = jwt_helper.get_tokens(payload)
     app_repo.update_token(app, token.get('token'))
     
@@ -164,10 +164,12 @@ async def sync_app_roles(
 @router.delete("/{id}", status_code=204)
 async def delete_app(
     id: str,
+    request: Request,
     auth: AuthPayload = Depends(require_permissions("User - App - delete")),
     db: Session = Depends(get_db)
 ):
-    app_repo = AppRepository(db)
+    cache = getattr(request.app.state, 'cache', None)
+    app_repo = AppRepository(db, cache)
     app_repo.delete(id)
     return None
 
@@ -1,13 +1,21 @@
 import datetime
+import jwt
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 
+from ms_fa.config import settings
 from ms_fa.db import get_db
-from ms_fa.helpers.jwt import JwtHelper
+from ms_fa.helpers.authz import authz
+from ms_fa.helpers.hash import hash_pool
+from ms_fa.helpers import rate_limit
+from ms_fa.helpers.jwt import JwtHelper, TOKEN_VERSION
+from ms_fa.helpers.revocation import revocations
 from ms_fa.helpers.time import epoch_now
 from ms_fa.helpers.utils import random_integer, random_string
 from ms_fa.helpers.notification import send_reset_password_notification
-from ms_fa.middlewares import get_current_user, AuthPayload, require_permissions
+from ms_fa.middlewares import get_current_user, AuthPayload, require_permissions, resolve_principals
+from ms_fa.models import User
 from ms_fa.repositories import UserRepository, ShopperRepository, ResetPasswordRepository, SessionRepository
 from ms_fa.schemas.auth import (
     AuthRegisterRequest,
@@ -17,37 +25,65 @@ from ms_fa.schemas.auth import (
     AuthForgotPasswordRequest,
     AuthResetPasswordRequest,
     ValidateTokenNotificationRequest,
+    AuthCheckBatchRequest,
     AuthTokenResponse,
+    AuthCheckBatchResponse,
     AuthValidateEmailResponse,
     ForgotPasswordResponse,
 )
 from ms_fa.schemas.user import UserProfileResponse
 
 router = APIRouter()
+security = HTTPBearer()
 
 
-def get_token(user, jwt_helper: JwtHelper):
+def get_token(user, snapshot: dict, jwt_helper: JwtHelper, version: int):
+    profile = snapshot.get("profile") or {}
     data = {
         "id": user.id,
+        "kind": "user",
+        "ver": TOKEN_VERSION,
         "aq_id": user.aq_id,
         "session": random_string(length=64),
-        "available_credit": user.profile.available_credit if user.profile else 0,
-        "payment_capacity": user.profile.payment_capacity if user.profile else 0,
-        "second_credit": user.profile.second_credit if user.profile else False,
-        "roles": [role.name for role in user.roles],
+        "available_credit": profile.get("available_credit", 0),
+        "payment_capacity": profile.get("payment_capacity", 0),
+        "second_credit": profile.get("second_credit", False),
+        "roles": snapshot["roles"],
+        "perms": authz.bitset(snapshot["permissions"]),
+        "azv": version,
     }
     return jwt_helper.get_tokens(data), data
 
 
-def save_login_data(user, payload, session_repo: SessionRepository, user_repo: UserRepository, jwt_helper: JwtHelper, cache=None):
-    session_repo.add({
-        "user_id": user.id,
-        "token": payload.get("session", ""),
-        "expires_at": datetime.datetime.fromtimestamp(epoch_now() + jwt_helper.token_lifetime),
-    })
+def session_expiry(jwt_helper: JwtHelper) -> datetime.datetime:
+    # A session lives as long as its refresh token can be used
+    return datetime.datetime.fromtimestamp(epoch_now() + jwt_helper.refresh_token_lifetime)
+
+
+def save_login_data(user, payload, snapshot: dict, session_repo: SessionRepository, user_repo: UserRepository, jwt_helper: JwtHelper):
+    user_repo.setCache(user, force=True, data=snapshot)
+    session_repo.open(user.id, payload.get("session", ""), session_expiry(jwt_helper))
+
+
+def issue_token(user, jwt_helper: JwtHelper, user_repo: UserRepository, cache=None):
+    # Read the authz version before the permissions so a concurrent change
+    # leaves the token stamped with the older version.
+    version = authz.current_version(cache, fresh=True)
+    snapshot = user_repo.snapshot(user)
+    token, payload = get_token(user, snapshot, jwt_helper, version)
+    return token, payload, snapshot
+
+
+def login_user(user, jwt_helper: JwtHelper, user_repo: UserRepository, session_repo: SessionRepository, cache=None):
+    """
+    Issue a token pair for `user`, open its session and refresh its cache
+    snapshot. Roles and permissions are loaded once and shared by all three.
+    """
     if cache:
         user_repo.cache = cache
-    user_repo.setCache(user, force=True)
+    token, payload, snapshot = issue_token(user, jwt_helper, user_repo, cache)
+    save_login_data(user, payload, snapshot, session_repo, user_repo, jwt_helper)
+    return token
 
 
 @router.post("/register", response_model=AuthTokenResponse, status_code=201)
@@ -60,11 +96,12 @@ async def register(
     jwt_helper = JwtHelper(token_lifetime=60*60*24*15, refresh_token_lifetime=60*60*24*20)
     shopper_repo = ShopperRepository(db, cache)
     user_repo = UserRepository(db, cache)
-    session_repo = SessionRepository(db)
+    session_repo = SessionRepository(db, cache)
     
-    user = shopper_repo.add(data.model_dump())
-    token, payload = get_token(user, jwt_helper)
-    save_login_data(user, payload, session_repo, user_repo, jwt_helper, cache)
+    data = data.model_dump()
+    data["password_hash"] = await hash_pool.run(User.hash_password, data["password"])
+    user = shopper_repo.add(data)
+    token = login_user(user, jwt_helper, user_repo, session_repo, cache)
     
     return token
 
@@ -78,18 +115,30 @@ async def login(
     cache = getattr(request.app.state, 'cache', None)
     jwt_helper = JwtHelper(token_lifetime=60*60*24*15, refresh_token_lifetime=60*60*24*20)
     user_repo = UserRepository(db, cache)
-    session_repo = SessionRepository(db)
+    session_repo = SessionRepository(db, cache)
     
-    user = user_repo.find_optional({"phone": data.username, "email": data.username}, fail=False)
+    rate_limit.throttle(
+        request,
+        (rate_limit.login_by_username, data.username),
+        (rate_limit.login_by_ip, rate_limit.client_ip(request)),
+    )
     
-    if user is None or not user.verify_password(data.password):
+    user = user_repo.find_by_username(data.username, fail=False)
+    
+    valid, new_hash = False, None
+    if user is not None:
+        valid, new_hash = await hash_pool.run(user.verify_and_update_password, data.password)
+    
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="The credentials do not match our records."
         )
     
-    token, payload = get_token(user, jwt_helper)
-    save_login_data(user, payload, session_repo, user_repo, jwt_helper, cache)
+    if new_hash is not None:
+        user_repo.rehash_password(user, new_hash)
+    
+    token = login_user(user, jwt_helper, user_repo, session_repo, cache)
     
     return token
 
@@ -101,12 +150,18 @@ async def logout(
     db: Session = Depends(get_db)
 ):
     cache = getattr(request.app.state, 'cache', None)
+    jwt_helper = JwtHelper(token_lifetime=60*60*24*15, refresh_token_lifetime=60*60*24*20)
     user_repo = UserRepository(db, cache)
-    session_repo = SessionRepository(db)
+    session_repo = SessionRepository(db, cache)
+    
+    session_repo.delete(auth.user.id, auth.session)
     
-    session_repo.delete(auth.user, auth.session)
+    # The refresh token shares the session and outlives the access token
+    if auth.session:
+        lifetime_gap = jwt_helper.refresh_token_lifetime - jwt_helper.token_lifetime
+        revocations.revoke(cache, auth.session, auth.exp + lifetime_gap)
     
-    if not session_repo.has_active_session(auth.user):
+    if not session_repo.has_active_session(auth.user.id):
         user_repo.deleteCache(auth.user)
     
     return None
@@ -115,16 +170,54 @@ async def logout(
 @router.post("/refresh", response_model=AuthTokenResponse)
 async def refresh_token(
     request: Request,
-    auth: AuthPayload = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ):
+    """
+    Rotate the session: the current session row gets a new token and the
+    old one is revoked. Presenting an already rotated token again ends the
+    session it was rotated into, since the token has likely leaked.
+    """
     cache = getattr(request.app.state, 'cache', None)
     jwt_helper = JwtHelper(token_lifetime=60*60*24*15, refresh_token_lifetime=60*60*24*20)
     user_repo = UserRepository(db, cache)
-    session_repo = SessionRepository(db)
+    session_repo = SessionRepository(db, cache)
+    
+    def unauthorized(detail: str):
+        return HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=detail,
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    try:
+        payload = jwt_helper.verify(credentials.credentials)
+    except jwt.InvalidTokenError:
+        raise unauthorized("Invalid or expired token")
     
-    token, payload = get_token(auth.user, jwt_helper)
-    save_login_data(auth.user, payload, session_repo, user_repo, jwt_helper, cache)
+    old_token = payload.get("session")
+    if not old_token or payload.get("kind") == "app":
+        raise unauthorized("Invalid or expired token")
+    
+    rotated = session_repo.rotated(old_token)
+    if rotated is not None:
+        # Concurrent retries of the same refresh fall inside the grace period
+        if epoch_now() - rotated.get("rotated_at", 0) > settings.SESSION_REUSE_GRACE:
+            session_repo.revoke_family(old_token)
+        raise unauthorized("Refresh token has already been used")
+    
+    if revocations.is_revoked(old_token):
+        raise unauthorized("Token has been revoked")
+    
+    current = session_repo.find_by_token(payload.get("id"), old_token)
+    user = user_repo.find(payload.get("id"), fail=False) if current else None
+    if user is None:
+        raise unauthorized("Session expired")
+    
+    token, payload, snapshot = issue_token(user, jwt_helper, user_repo, cache)
+    if session_repo.rotate(current, payload["session"], session_expiry(jwt_helper)) is None:
+        raise unauthorized("Refresh token has already been used")
+    user_repo.setCache(user, force=True, data=snapshot)
     
     return token
 
@@ -139,11 +232,10 @@ async def generate_token(
     cache = getattr(request.app.state, 'cache', None)
     jwt_helper = JwtHelper(token_lifetime=60*60*24*15, refresh_token_lifetime=60*60*24*20)
     user_repo = UserRepository(db, cache)
-    session_repo = SessionRepository(db)
+    session_repo = SessionRepository(db, cache)
     
     user = user_repo.find_by_phone_and_email(data.phone, data.email)
-    token, payload = get_token(user, jwt_helper)
-    save_login_data(user, payload, session_repo, user_repo, jwt_helper, cache)
+    token = login_user(user, jwt_helper, user_repo, session_repo, cache)
     
     return token
 
@@ -153,6 +245,45 @@ async def check(auth: AuthPayload = Depends(get_current_user)):
     return None
 
 
+@router.post("/check/batch", response_model=AuthCheckBatchResponse)
+async def check_batch(
+    request: Request,
+    data: AuthCheckBatchRequest,
+    auth: AuthPayload = Depends(require_permissions("User - introspect tokens")),
+    db: Session = Depends(get_db)
+):
+    cache = getattr(request.app.state, 'cache', None)
+    jwt_helper = JwtHelper()
+
+    claims = []
+    for token in data.tokens:
+        try:
+            payload = jwt_helper.verify(token)
+        except jwt.InvalidTokenError:
+            payload = None
+        if payload is not None and revocations.is_revoked(payload.get("session")):
+            payload = None
+        claims.append(payload)
+
+    kinds = {c.get("id"): c.get("kind") for c in claims if c and c.get("id")}
+    principals = resolve_principals(list(kinds), db, cache, kinds)
+
+    result = []
+    for payload in claims:
+        principal = principals.get(payload.get("id")) if payload else None
+        if principal is None:
+            result.append({"valid": False})
+            continue
+        result.append({
+            "valid": True,
+            "id": principal.id,
+            "roles": principal.role_names,
+            "exp": payload.get("exp"),
+        })
+
+    return {"data": result}
+
+
 @router.post("/validate-email")
 async def validate_email(
     data: AuthValidateEmailRequest,
@@ -176,9 +307,15 @@ async def validate_email(
 
 @router.post("/validate-token-notification", status_code=204)
 async def validate_token_notification(
+    request: Request,
     data: ValidateTokenNotificationRequest,
     db: Session = Depends(get_db)
 ):
+    rate_limit.throttle(
+        request,
+        (rate_limit.reset_token_by_username, data.username),
+        (rate_limit.reset_token_by_ip, rate_limit.client_ip(request)),
+    )
     reset_repo = ResetPasswordRepository(db)
     token = reset_repo.get_by_token_and_username(data.token, data.username, fail=False)
     
@@ -193,9 +330,15 @@ async def validate_token_notification(
 
 @router.post("/forgot-password", response_model=ForgotPasswordResponse)
 async def forgot_password(
+    request: Request,
     data: AuthForgotPasswordRequest,
     db: Session = Depends(get_db)
 ):
+    rate_limit.throttle(
+        request,
+        (rate_limit.notification_by_username, data.username),
+        (rate_limit.notification_by_ip, rate_limit.client_ip(request)),
+    )
     user_repo = UserRepository(db)
     reset_repo = ResetPasswordRepository(db)
     
@@ -225,11 +368,17 @@ async def reset_password(
     data: AuthResetPasswordRequest,
     db: Session = Depends(get_db)
 ):
+    # Same code space as /validate-token-notification, so the same IP bucket
+    rate_limit.throttle(
+        request,
+        (rate_limit.reset_token_by_token, data.token),
+        (rate_limit.reset_token_by_ip, rate_limit.client_ip(request)),
+    )
     cache = getattr(request.app.state, 'cache', None)
     jwt_helper = JwtHelper(token_lifetime=60*60*24*15, refresh_token_lifetime=60*60*24*20)
     user_repo = UserRepository(db, cache)
     reset_repo = ResetPasswordRepository(db)
-    session_repo = SessionRepository(db)
+    session_repo = SessionRepository(db, cache)
     
     token_obj = reset_repo.get_by_token(data.token, fail=False)
     
@@ -241,10 +390,10 @@ async def reset_password(
     
     user = user_repo.find_optional({"phone": token_obj.username, "email": token_obj.username}, fail=False)
     reset_repo.delete(token_obj.id)
-    user_repo.update_password(user, data.password)
+    password_hash = await hash_pool.run(User.hash_password, data.password)
+    user_repo.update_password(user, data.password, password_hash=password_hash)
     
-    token, payload = get_token(user, jwt_helper)
-    save_login_data(user, payload, session_repo, user_repo, jwt_helper, cache)
+    token = login_user(user, jwt_helper, user_repo, session_repo, cache)
     
     return token
 
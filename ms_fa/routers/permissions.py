@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from ms_fa.db import get_db
-from ms_fa.middlewares import AuthPayload, require_permissions, require_roles
+from ms_fa.helpers.authz import authz, decode_bitset
+from ms_fa.middlewares import AuthPayload, require_permissions, require_roles, route_table
 from ms_fa.repositories import PermissionRepository
 from ms_fa.schemas.permission import (
     PermissionCreateRequest,
     PermissionUpdateRequest,
+    PermissionMaskDecodeRequest,
+    PermissionMaskDecodeResponse,
 )
 from ms_fa.helpers.time import datetime_to_epoch
 
@@ -65,13 +68,47 @@ async def list_permissions(
     return [serialize_permission(p) for p in permissions]
 
 
+@router.post("/permissions/decode", response_model=PermissionMaskDecodeResponse)
+async def decode_permission_mask(
+    request: Request,
+    data: PermissionMaskDecodeRequest,
+    auth: AuthPayload = Depends(require_permissions("User - Permission - list")),
+):
+    """Names behind a permission bitmask, as found in snapshots (`mask`) and tokens (`perms`)."""
+    try:
+        mask = decode_bitset(data.mask)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid permission mask")
+    cache = getattr(request.app.state, 'cache', None)
+    version = authz.current_version(cache)
+    return {
+        "mask": data.mask,
+        "version": version,
+        "permissions": [
+            {"ordinal": ordinal, "name": name} for ordinal, name in authz.decode(mask)
+        ],
+    }
+
+
+@router.get("/permissions/routes")
+async def list_route_requirements(
+    request: Request,
+    auth: AuthPayload = Depends(require_roles("root")),
+):
+    """Authorization table compiled at startup: the permissions and roles each route requires."""
+    authz.current_version(getattr(request.app.state, 'cache', None))
+    return route_table.describe()
+
+
 @router.post("/permission", status_code=201)
 async def create_permission(
+    request: Request,
     data: PermissionCreateRequest,
     auth: AuthPayload = Depends(require_roles("root")),
     db: Session = Depends(get_db)
 ):
-    permission_repo = PermissionRepository(db)
+    cache = getattr(request.app.state, 'cache', None)
+    permission_repo = PermissionRepository(db, cache)
     permission = permission_repo.add(data.model_dump())
     return serialize_permission(permission)
 
@@ -90,11 +127,13 @@ async def get_permission(
 @router.put("/permission/{id}")
 async def update_permission(
     id: str,
+    request: Request,
     data: PermissionUpdateRequest,
     auth: AuthPayload = Depends(require_roles("root")),
     db: Session = Depends(get_db)
 ):
-    permission_repo = PermissionRepository(db)
+    cache = getattr(request.app.state, 'cache', None)
+    permission_repo = PermissionRepository(db, cache)
     permission = permission_repo.update(id, data.model_dump(exclude_unset=True))
     return serialize_permission(permission)
 
@@ -102,10 +141,12 @@ async def update_permission(
 @router.delete("/permission/{id}", status_code=204)
 async def delete_permission(
     id: str,
+    request: Request,
     auth: AuthPayload = Depends(require_roles("root")),
     db: Session = Depends(get_db)
 ):
-    permission_repo = PermissionRepository(db)
+    cache = getattr(request.app.state, 'cache', None)
+    permission_repo = PermissionRepository(db, cache)
     permission, success = permission_repo.delete(id)
     if not success:
         raise HTTPException(
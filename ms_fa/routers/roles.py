@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from typing import Optional
 
@@ -100,11 +100,13 @@ async def get_role(
 @router.put("/role/{id}")
 async def update_role(
     id: str,
+    request: Request,
     data: RoleUpdateRequest,
     auth: AuthPayload = Depends(require_roles("root")),
     db: Session = Depends(get_db)
 ):
-    role_repo = RoleRepository(db)
+    cache = getattr(request.app.state, 'cache', None)
+    role_repo = RoleRepository(db, cache)
     role, success = role_repo.update(id, data.model_dump(exclude_unset=True))
     if not success:
         raise HTTPException(status_code=403, detail="It's not possible modify the root role")
@@ -114,11 +116,13 @@ async def update_role(
 @router.post("/role/{id}/sync-permissions", status_code=204)
 async def sync_role_permissions(
     id: str,
+    request: Request,
     data: RoleSyncPermissionsRequest,
     auth: AuthPayload = Depends(require_roles("root")),
     db: Session = Depends(get_db)
 ):
-    role_repo = RoleRepository(db)
+    cache = getattr(request.app.state, 'cache', None)
+    role_repo = RoleRepository(db, cache)
     role_repo.sync_permissions(id, data.permissions)
     return None
 
@@ -126,10 +130,12 @@ async def sync_role_permissions(
 @router.delete("/role/{id}", status_code=204)
 async def delete_role(
     id: str,
+    request: Request,
     auth: AuthPayload = Depends(require_roles("root")),
     db: Session = Depends(get_db)
 ):
-    role_repo = RoleRepository(db)
+    cache = getattr(request.app.state, 'cache', None)
+    role_repo = RoleRepository(db, cache)
     role, success = role_repo.delete(id)
     if not success:
         raise HTTPException(
@@ -1,4 +1,8 @@
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ms_fa.db.cache import local_cache
+from ms_fa.helpers.hash import hash_pool
 
 web_router = APIRouter(tags=["Web"])
 
@@ -7,3 +11,29 @@ web_router = APIRouter(tags=["Web"])
 async def index():
     return {"message": "Welcome to MS Users FastAPI"}
 
+
+@web_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Worker metrics in the Prometheus text exposition format."""
+    lines = []
+    for prefix, stats, metrics in (
+        ("ms_users_hash_pool", hash_pool.stats(), (
+            ("workers", "gauge", "Password hashing worker threads."),
+            ("queue_limit", "gauge", "Hashing calls allowed to wait for a worker."),
+            ("active", "gauge", "Hashing calls running on a worker."),
+            ("queued", "gauge", "Hashing calls waiting for a worker."),
+            ("completed", "counter", "Hashing calls completed."),
+            ("rejected", "counter", "Hashing calls rejected with 503 because the queue was full."),
+        )),
+        ("ms_users_local_cache", local_cache.stats(), (
+            ("size", "gauge", "Entries held in the in-process cache."),
+            ("hits", "counter", "Cache reads served from the in-process cache."),
+            ("misses", "counter", "Cache reads that went to Redis."),
+        )),
+    ):
+        for name, kind, help in metrics:
+            metric = f"{prefix}_{name}" + ("_total" if kind == "counter" else "")
+            lines.append(f"# HELP {metric} {help}")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {stats[name]}")
+    return "\n".join(lines) + "\n"
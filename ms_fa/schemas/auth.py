@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, List
 from pydantic import BaseModel, Field, EmailStr
 
 
@@ -39,6 +39,10 @@ class ValidateTokenNotificationRequest(BaseModel):
     token: str
 
 
+class AuthCheckBatchRequest(BaseModel):
+    tokens: List[str] = Field(..., min_length=1, max_length=500)
+
+
 class AuthTokenResponse(BaseModel):
     token: str
     refresh_token: str
@@ -55,3 +59,14 @@ class AuthValidateEmailResponse(BaseModel):
 class ForgotPasswordResponse(BaseModel):
     phone: str
 
+
+
+class AuthCheckBatchItem(BaseModel):
+    valid: bool
+    id: Optional[str] = None
+    roles: List[str] = []
+    exp: Optional[int] = None
+
+
+class AuthCheckBatchResponse(BaseModel):
+    data: List[AuthCheckBatchItem]
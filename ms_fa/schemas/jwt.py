@@ -4,6 +4,8 @@ from pydantic import BaseModel
 
 class JwtPayload(BaseModel):
     id: str
+    kind: str = "user"
+    ver: Optional[int] = None
     aq_id: Optional[int] = None
     session: str
     roles: List[str] = []
@@ -14,4 +16,6 @@ class JwtPayload(BaseModel):
 
 class AppJwtPayload(BaseModel):
     id: str
+    kind: str = "app"
+    ver: Optional[int] = None
 
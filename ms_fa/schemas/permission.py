@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 
 
@@ -32,3 +32,18 @@ class PermissionListParams(BaseModel):
     order_column: str = "created_at"
     q: Optional[str] = None
 
+
+
+class PermissionMaskDecodeRequest(BaseModel):
+    mask: str
+
+
+class PermissionMaskEntry(BaseModel):
+    ordinal: int
+    name: Optional[str] = None
+
+
+class PermissionMaskDecodeResponse(BaseModel):
+    mask: str
+    version: int
+    permissions: List[PermissionMaskEntry]
@@ -1,3 +1,5 @@
 from .worker import celery
 from .update_cache import update_cache_task
+from .reap_cache import reap_cache_task
+from .refresh_role_members import refresh_role_members_task
 
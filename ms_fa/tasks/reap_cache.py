@@ -0,0 +1,21 @@
+import logging
+
+from ms_fa.tasks.worker import celery
+from ms_fa.db.cache import Cache
+from ms_fa.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+@celery.task
+def reap_cache_task():
+    """Task to unlink the keys of retired cache generations and legacy snapshots."""
+    cache = Cache(settings.redis_config)
+    removed = cache.reap(grace=settings.CACHE_REAP_GRACE)
+    if removed:
+        logger.info("Reaped %d keys of retired cache generations", removed)
+    legacy = cache.reap_legacy()
+    if legacy:
+        logger.info("Reaped %d legacy snapshot keys", legacy)
+    return removed + legacy
@@ -0,0 +1,22 @@
+from ms_fa.tasks.worker import celery
+from ms_fa.db import SessionLocal
+from ms_fa.db.cache import Cache
+from ms_fa.config import settings
+from ms_fa.repositories import RoleRepository
+
+
+@celery.task
+def refresh_role_members_task(role_id: str, drop_index: bool = False):
+    """Task to rebuild the cached snapshots of every member of a role."""
+    db = SessionLocal()
+    cache = Cache(settings.redis_config)
+
+    try:
+        role_repo = RoleRepository(db, cache)
+        refreshed = role_repo.refresh_members(role_id)
+        if drop_index:
+            # The role is gone; its index was only kept for this refresh
+            cache.delete(role_repo.members_key(role_id))
+        return refreshed
+    finally:
+        db.close()
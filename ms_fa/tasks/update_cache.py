@@ -1,6 +1,6 @@
 from ms_fa.tasks.worker import celery
 from ms_fa.db import SessionLocal
-from ms_fa.db.cache import Cache
+from ms_fa.db.cache import Cache, chunks
 from ms_fa.config import settings
 from ms_fa.repositories import UserRepository, AppRepository, SessionRepository
 
@@ -16,17 +16,20 @@ def update_cache_task():
         app_repo = AppRepository(db, cache)
         session_repo = SessionRepository(db)
 
-        prefix = "ms-users-"
         users = session_repo.get_users_with_active_session()
-        apps = app_repo.all()
+        apps = [a.id for a in app_repo.all()]
 
-        for u in users:
-            if not cache.exists(f"{prefix}{u.id}"):
-                user_repo.setCache(u, force=True)
-        
-        for a in apps:
-            if not cache.exists(f"{prefix}{a.id}"):
-                app_repo.setCache(a)
+        # One existence pipeline, one grants query and one write pipeline per chunk
+        for batch in chunks(users, cache.chunk_size):
+            keys = user_repo.cache_keys([u.id for u in batch])
+            missing = [u for u, exists in zip(batch, cache.exists_many(keys)) if not exists]
+            snapshots = user_repo.snapshots(missing)
+            cache.set_hashes(dict(zip(user_repo.cache_keys(list(snapshots)), snapshots.values())))
+
+        for batch in chunks(apps, cache.chunk_size):
+            keys = app_repo.cache_keys(batch)
+            missing = [id for id, exists in zip(batch, cache.exists_many(keys)) if not exists]
+            snapshots = app_repo.snapshots(missing)
+            cache.set_hashes(dict(zip(app_repo.cache_keys(list(snapshots)), snapshots.values())))
     finally:
         db.close()
-
@@ -14,5 +14,9 @@ auth = f'{redis_user}:{redis_pass}' if redis_pass else redis_user
 celery = Celery('worker')
 celery.conf.broker_url = f'redis://{auth}@{redis_host}:{redis_port}/1'
 celery.conf.result_backend = f'redis://{auth}@{redis_host}:{redis_port}/2'
-celery.conf.imports = ['ms_fa.tasks', 'ms_fa.tasks.update_cache']
-
+celery.conf.imports = [
+    'ms_fa.tasks',
+    'ms_fa.tasks.update_cache',
+    'ms_fa.tasks.reap_cache',
+    'ms_fa.tasks.refresh_role_members',
+]
@@ -0,0 +1,89 @@
+import contextlib
+import io
+import os
+import tempfile
+from pathlib import Path
+
+# Settings are read on import: point them at a throwaway database first
+_database = os.path.join(tempfile.mkdtemp(prefix="ms-fa-tests-"), "test.sqlite")
+os.environ["APP_ENV"] = "testing"
+os.environ.setdefault("APP_SECRET_KEY", "testing-secret")
+os.environ["DB_CONNECTION"] = "sqlite"
+os.environ["DB_DATABASE"] = os.path.relpath(_database, Path(__file__).parents[1])
+
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+
+from ms_fa.db import Base, SessionLocal, engine
+from ms_fa.db import cache as cache_module
+from ms_fa.db.seeders import SEEDERS
+from ms_fa.tasks.worker import celery
+
+
+redis_server = fakeredis.FakeServer()
+cache_module.Cache.connection = lambda self: fakeredis.FakeRedis(server=redis_server)
+cache_module.AsyncCache.connection = lambda self: fakeredis.FakeAsyncRedis(server=redis_server)
+
+# Run tasks in-process instead of sending them to a broker
+celery.conf.task_always_eager = True
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for seeder in sorted(SEEDERS, key=lambda seeder: seeder.priority):
+                seeder(db).run()
+    finally:
+        db.close()
+    yield
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def app(database):
+    from ms_fa import app
+
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def redis():
+    """Every test starts with an empty Redis and local cache."""
+    conn = fakeredis.FakeRedis(server=redis_server)
+    conn.flushall()
+    cache_module.local_cache.reset()
+    yield conn
+
+
+@pytest.fixture
+def cache(client, app):
+    return app.state.cache
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def login(client):
+    def login(username: str = "root@example.com", password: str = "secret") -> dict:
+        response = client.post("/api/v1/users/login", json={"username": username, "password": password})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return login
@@ -0,0 +1,19 @@
+from ms_fa.models import App
+from ms_fa.repositories import AppRepository
+
+
+def test_delete_app_drops_its_snapshot(client, cache, db, login):
+    app = db.query(App).first()
+    repo = AppRepository(db, cache)
+    repo.setCache(app)
+    key = repo.cache_key(app.id)
+    assert cache.get_hash(key) is not None
+
+    token = login()["token"]
+    response = client.delete(
+        f"/api/v1/users/admin/apps/{app.id}",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 204
+    assert cache.get_hash(key) is None
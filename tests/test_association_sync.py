@@ -0,0 +1,52 @@
+import pytest
+from fastapi import HTTPException
+
+from ms_fa.models import Permission
+from ms_fa.models.association_tables import permission_role_table
+from ms_fa.repositories import RoleRepository
+
+
+@pytest.fixture
+def role(db):
+    role = RoleRepository(db).add({"name": "syncing", "fixed": False})
+    yield role
+    RoleRepository(db).delete(role.id)
+
+
+@pytest.fixture
+def permission_ids(db):
+    return [id for id, in db.query(Permission.id).order_by(Permission.ordinal).limit(4)]
+
+
+def sync(db, role, ids):
+    return RoleRepository(db).db_sync_association(
+        permission_role_table, "role_id", role.id, "permission_id", Permission, ids
+    )
+
+
+def test_sync_writes_only_the_difference(db, role, permission_ids):
+    a, b, c, d = permission_ids
+
+    assert sync(db, role, [a, b, c]) == ({a, b, c}, set())
+    assert sync(db, role, [b, c, d]) == ({d}, {a})
+    assert sync(db, role, [b, c, d]) == (set(), set())
+
+    db.expire(role)
+    assert {permission.id for permission in role.permissions} == {b, c, d}
+
+
+def test_sync_to_nothing_removes_everything(db, role, permission_ids):
+    sync(db, role, permission_ids[:2])
+
+    assert sync(db, role, []) == (set(), set(permission_ids[:2]))
+
+
+def test_unknown_ids_are_rejected_before_writing(db, role, permission_ids):
+    sync(db, role, permission_ids[:1])
+
+    with pytest.raises(HTTPException) as error:
+        sync(db, role, [permission_ids[1], "missing"])
+
+    assert error.value.status_code == 404
+    db.expire(role)
+    assert [permission.id for permission in role.permissions] == permission_ids[:1]
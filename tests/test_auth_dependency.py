@@ -0,0 +1,31 @@
+import jwt
+
+from ms_fa.db.cache import local_cache
+from ms_fa.helpers.authz import authz
+from ms_fa.repositories import UserRepository
+
+
+def test_snapshot_is_stamped_in_a_fresh_process(client, cache, db, redis, login, monkeypatch):
+    token = login("shopper@example.com")["token"]
+    user_id = jwt.decode(token, options={"verify_signature": False})["id"]
+    redis.flushall()
+    local_cache.reset()
+    monkeypatch.setattr(authz, "version", None)
+
+    assert client.post("/api/v1/users/check", headers={"Authorization": f"Bearer {token}"}).status_code == 204
+
+    snapshot = cache.get_hash(UserRepository(db, cache).cache_key(user_id))
+    assert snapshot["azv"] == authz.version
+    assert "mask" in snapshot
+
+
+def test_handlers_load_the_entity_on_demand(client, login):
+    headers = {"Authorization": f"Bearer {login('shopper@example.com')['token']}"}
+
+    profile = client.get("/api/v1/users/profile", headers=headers)
+    permissions = client.get("/api/v1/users/profile/permissions", headers=headers)
+    devices = client.get("/api/v1/users/profile/devices", headers=headers)
+
+    assert profile.status_code == 200 and profile.json()["email"] == "shopper@example.com"
+    assert permissions.status_code == 200
+    assert devices.status_code == 200
@@ -0,0 +1,58 @@
+import pytest
+
+from ms_fa.helpers.authz import Authz, decode_bitset, encode_bitset
+
+
+@pytest.fixture
+def authz():
+    authz = Authz()
+    authz.ordinals = {"read": 0, "write": 1, "admin": 70}
+    authz.names_by_ordinal = {ordinal: name for name, ordinal in authz.ordinals.items()}
+    authz.generation += 1
+    return authz
+
+
+def test_bitset_round_trip():
+    ordinals = [0, 3, 64, 200]
+
+    mask = decode_bitset(encode_bitset(ordinals))
+
+    assert mask == sum(1 << ordinal for ordinal in ordinals)
+
+
+def test_empty_bitset_decodes_to_zero():
+    assert encode_bitset([]) == ""
+    assert decode_bitset("") == 0
+
+
+def test_bitset_skips_unknown_names(authz):
+    assert decode_bitset(authz.bitset(["read", "admin", "missing"])) == (1 << 0) | (1 << 70)
+
+
+def test_decode_lists_names_in_ordinal_order(authz):
+    assert authz.decode(authz.mask(["admin", "read"])) == [(0, "read"), (70, "admin")]
+
+
+def test_compiled_mask_allows_any_of_its_permissions(authz):
+    required = authz.compile(["write", "admin"])
+
+    assert required.allows(authz.mask(["admin"]))
+    assert not required.allows(authz.mask(["read"]))
+
+
+def test_compiled_mask_follows_ordinal_reloads(authz):
+    required = authz.compile(["write"])
+    assert required.value == 1 << 1
+
+    authz.ordinals = {"read": 0, "write": 5}
+    authz.generation += 1
+
+    assert required.value == 1 << 5
+
+
+def test_stamp_adds_mask_and_version(authz):
+    snapshot = authz.stamp({"permissions": ["write"]}, 7)
+
+    assert decode_bitset(snapshot["mask"]) == 1 << 1
+    assert snapshot["azv"] == 7
+    assert "mask" not in authz.stamp({"permissions": ["write"]}, None)
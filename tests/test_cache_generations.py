@@ -0,0 +1,43 @@
+from ms_fa.db.cache import LEGACY_REAPED_KEY, RETIRED_GENERATIONS_KEY
+
+
+def test_truncate_moves_the_namespace_to_a_new_generation(cache):
+    old_prefix = cache.namespace_prefix("things")
+    cache.set_hash(old_prefix + "1", {"id": "1"})
+
+    assert cache.truncate("things")
+
+    new_prefix = cache.namespace_prefix("things")
+    assert new_prefix != old_prefix
+    assert cache.get_hash(new_prefix + "1") is None
+
+
+def test_reap_unlinks_retired_generations_only(cache, redis):
+    old_prefix = cache.namespace_prefix("things")
+    for id in range(5):
+        cache.set_hash(f"{old_prefix}{id}", {"id": id})
+    cache.truncate("things")
+    current = cache.namespace_prefix("things") + "1"
+    cache.set_hash(current, {"id": 1})
+
+    assert cache.reap(grace=3600) == 0
+    assert cache.reap(grace=0) == 5
+
+    assert redis.keys(f"{old_prefix}*") == []
+    assert cache.get_hash(current) == {"id": 1}
+    assert redis.zcard(RETIRED_GENERATIONS_KEY) == 0
+
+
+def test_reap_legacy_stops_after_a_clean_pass(cache, redis):
+    for id in range(3):
+        redis.set(f"ms-users-{id}", "{}")
+    redis.set("ms-users:rate-limit:login", 1)
+
+    assert cache.reap_legacy() == 3
+    assert not redis.exists(LEGACY_REAPED_KEY)
+    assert cache.reap_legacy() == 0
+    assert redis.exists(LEGACY_REAPED_KEY)
+
+    redis.set("ms-users-late", "{}")
+    assert cache.reap_legacy() == 0
+    assert redis.exists("ms-users:rate-limit:login")
@@ -0,0 +1,42 @@
+def check_batch(client, token: str, tokens: list):
+    return client.post(
+        "/api/v1/users/check/batch",
+        json={"tokens": tokens},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+
+
+def test_batch_reports_each_token(client, login):
+    gateway = login()["token"]
+    shopper = login("shopper@example.com")["token"]
+
+    response = check_batch(client, gateway, [shopper, "junk", gateway])
+
+    assert response.status_code == 200
+    first, second, third = response.json()["data"]
+    assert first["valid"] and first["roles"] == ["shopper"]
+    assert second == {"valid": False, "id": None, "roles": [], "exp": None}
+    assert third["valid"] and "root" in third["roles"]
+
+
+def test_revoked_tokens_are_invalid(client, login):
+    gateway = login()["token"]
+    shopper = login("shopper@example.com")["token"]
+    client.post("/api/v1/users/logout", headers={"Authorization": f"Bearer {shopper}"})
+
+    response = check_batch(client, gateway, [shopper])
+
+    assert response.json()["data"] == [{"valid": False, "id": None, "roles": [], "exp": None}]
+
+
+def test_batch_requires_the_introspection_permission(client, login):
+    shopper = login("shopper@example.com")["token"]
+
+    assert check_batch(client, shopper, [shopper]).status_code == 403
+
+
+def test_batch_size_is_bounded(client, login):
+    gateway = login()["token"]
+
+    assert check_batch(client, gateway, []).status_code == 422
+    assert check_batch(client, gateway, ["junk"] * 501).status_code == 422
@@ -0,0 +1,36 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from ms_fa.helpers.hash import HashPool
+
+
+def test_calls_beyond_workers_and_queue_are_rejected():
+    pool = HashPool(workers=1, queue_limit=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(HTTPException) as error:
+                await pool.run(lambda: None)
+        finally:
+            release.set()
+        await asyncio.gather(*running)
+        return error.value
+
+    error = asyncio.run(scenario())
+
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == "1"
+    assert pool.stats()["rejected"] == 1
+    assert pool.stats()["completed"] == 2
+
+
+def test_results_come_back_from_the_worker():
+    pool = HashPool(workers=2, queue_limit=0)
+
+    assert asyncio.run(pool.run(pow, 2, 10)) == 1024
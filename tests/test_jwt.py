@@ -0,0 +1,43 @@
+import jwt
+import pytest
+
+from ms_fa.helpers.jwt import JwtHelper, KeyRing, verified_tokens
+
+
+def helper(accept_legacy: bool) -> JwtHelper:
+    jwt_helper = JwtHelper()
+    jwt_helper.keyring = KeyRing(None, "HS256", secret="testing-secret", accept_legacy=accept_legacy)
+    return jwt_helper
+
+
+def legacy_token() -> str:
+    return jwt.encode({"id": "someone", "exp": 9999999999}, "testing-secret", algorithm="HS256")
+
+
+@pytest.fixture(autouse=True)
+def clear_verified_tokens():
+    verified_tokens.clear()
+
+
+def test_tokens_without_kid_are_accepted_by_default():
+    assert helper(accept_legacy=True).verify(legacy_token())["id"] == "someone"
+
+
+def test_tokens_without_kid_are_rejected_when_legacy_is_off():
+    with pytest.raises(jwt.InvalidTokenError):
+        helper(accept_legacy=False).verify(legacy_token())
+
+
+def test_tokens_with_kid_still_verify_when_legacy_is_off():
+    jwt_helper = helper(accept_legacy=False)
+
+    token = jwt_helper.encode({"id": "someone"}, 60)
+
+    assert jwt_helper.verify(token)["id"] == "someone"
+
+
+def test_unknown_kid_is_rejected():
+    token = jwt.encode({"id": "someone", "exp": 9999999999}, "testing-secret", algorithm="HS256", headers={"kid": "nope"})
+
+    with pytest.raises(jwt.InvalidTokenError):
+        helper(accept_legacy=True).verify(token)
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+from ms_fa.db.cache import CACHE_INVALIDATION_CHANNEL, AsyncCache, Cache, local_cache
+from ms_fa.helpers.time import epoch_now
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def test_reads_are_served_locally_until_invalidated(cache, redis):
+    assert wait_for(lambda: local_cache.active)
+    cache.set("local-key", {"value": 1})
+    assert cache.get("local-key") == {"value": 1}
+
+    # Written behind the cache's back: the local copy still wins
+    redis.set("local-key", cache.codec.encode("local-key", {"value": 2}, None, epoch_now()))
+    assert cache.get("local-key") == {"value": 1}
+
+    redis.publish(CACHE_INVALIDATION_CHANNEL, "local-key")
+    assert wait_for(lambda: cache.get("local-key") == {"value": 2})
+
+
+def test_writes_through_another_client_invalidate(cache):
+    from ms_fa.config import settings
+
+    assert wait_for(lambda: local_cache.active)
+    cache.set("shared-key", "old")
+    assert cache.get("shared-key") == "old"
+
+    other = Cache(settings.redis_config)
+    other.conn.set("shared-key", other.codec.encode("shared-key", "new", None, epoch_now()))
+    other.conn.publish(CACHE_INVALIDATION_CHANNEL, "shared-key")
+
+    assert wait_for(lambda: cache.get("shared-key") == "new")
+
+
+def test_hits_are_copies(cache):
+    assert wait_for(lambda: local_cache.active)
+    cache.set("copied-key", {"roles": ["a"]})
+    cache.get("copied-key")["roles"].append("b")
+
+    assert cache.get("copied-key") == {"roles": ["a"]}
+
+
+def test_fill_is_dropped_when_an_invalidation_raced_it(cache):
+    assert wait_for(lambda: local_cache.active)
+    epoch = local_cache.epoch
+    local_cache.invalidate("raced-key")
+
+    local_cache.fill("raced-key", {"data": "stale"}, epoch)
+
+    assert local_cache.lookup("raced-key") == (False, None)
+
+
+def test_async_set_hash_replaces_the_document(redis):
+    from ms_fa.config import settings
+
+    async_cache = AsyncCache(settings.redis_config)
+    redis.hset("async-hash", mapping={"stale": "1"})
+    local_cache.fill("async-hash", {"data": {"stale": 1}}, local_cache.epoch)
+
+    asyncio.run(async_cache.set_hash("async-hash", {"id": 1, "profile": {"rfc": "X"}}, exp=60))
+
+    assert redis.hgetall("async-hash") == {b"id": b"1", b"profile.rfc": b'"X"'}
+    assert 0 < redis.ttl("async-hash") <= 60
+    assert local_cache.lookup("async-hash") == (False, None)
@@ -0,0 +1,45 @@
+import pytest
+
+from ms_fa.helpers.hash import build_pwd_context, pwd_context
+from ms_fa.models import User
+
+
+@pytest.fixture
+def user(db):
+    user = db.query(User).filter_by(email="merchant_root@example.com").first()
+    original = user.password
+    yield user
+    user.password = original
+    db.commit()
+
+
+@pytest.mark.parametrize("old_policy", [
+    {"pbkdf2_rounds": 1000},
+    {"scheme": "bcrypt", "bcrypt_rounds": 4},
+])
+def test_outdated_hash_is_upgraded_on_login(client, db, login, user, old_policy):
+    user.password = build_pwd_context(**old_policy).hash("secret")
+    db.commit()
+    assert pwd_context.needs_update(user.password)
+
+    login(user.email)
+
+    db.refresh(user)
+    assert not pwd_context.needs_update(user.password)
+    assert pwd_context.verify("secret", user.password)
+
+
+def test_current_hash_is_left_alone(client, db, login, user):
+    user.password = pwd_context.hash("secret")
+    db.commit()
+    current = user.password
+
+    login(user.email)
+
+    db.refresh(user)
+    assert user.password == current
+
+
+def test_unknown_scheme_is_rejected():
+    with pytest.raises(ValueError):
+        build_pwd_context(scheme="md5_crypt")
@@ -0,0 +1,58 @@
+import pytest
+
+from ms_fa.models import Permission
+from ms_fa.repositories import RoleRepository, UserRepository
+
+
+@pytest.fixture
+def lister(db, cache):
+    """A user whose only grant is `User - Permission - list`, through a role."""
+    permission = db.query(Permission).filter_by(name="User - Permission - list").first()
+    role_repo = RoleRepository(db, cache)
+    role = role_repo.add({"name": "lister", "fixed": False})
+    role_repo.sync_permissions(role.id, [permission.id])
+    user = UserRepository(db, cache).add({
+        "email": "lister@example.com",
+        "phone": "5500000003",
+        "name": "List",
+        "lastname": "Er",
+        "password": "secret",
+        "role_id": role.id,
+    })
+    yield role
+    UserRepository(db).delete(user.id)
+    role_repo.delete(role.id)
+
+
+def list_permissions(client, token: str):
+    return client.get("/api/v1/users/admin/permissions/list", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_revoked_permission_is_not_honoured_before_the_member_refresh(client, db, cache, login, lister, monkeypatch):
+    token = login("lister@example.com")["token"]
+    assert list_permissions(client, token).status_code == 200
+
+    # The worker has not refreshed the members yet: their snapshots still list the permission
+    monkeypatch.setattr(RoleRepository, "enqueue_refresh", lambda self, role_id, drop_index=False: None)
+    RoleRepository(db, cache).sync_permissions(lister.id, [])
+
+    assert list_permissions(client, token).status_code == 403
+
+
+def test_granted_permission_is_honoured_before_the_member_refresh(client, db, cache, login, lister, monkeypatch):
+    RoleRepository(db, cache).sync_permissions(lister.id, [])
+    token = login("lister@example.com")["token"]
+    assert list_permissions(client, token).status_code == 403
+
+    monkeypatch.setattr(RoleRepository, "enqueue_refresh", lambda self, role_id, drop_index=False: None)
+    permission = db.query(Permission).filter_by(name="User - Permission - list").first()
+    RoleRepository(db, cache).sync_permissions(lister.id, [permission.id])
+
+    assert list_permissions(client, token).status_code == 200
+
+
+def test_current_token_bitset_is_trusted(client, login):
+    shopper = login("shopper@example.com")["token"]
+
+    assert list_permissions(client, shopper).status_code == 403
+    assert list_permissions(client, login()["token"]).status_code == 200
@@ -0,0 +1,48 @@
+import pytest
+from starlette.requests import Request
+
+from ms_fa.config import settings
+from ms_fa.helpers import rate_limit
+
+
+def request(peer: str, forwarded_for: str = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "client": (peer, 1234), "headers": headers})
+
+
+@pytest.fixture
+def trusted_proxies(monkeypatch):
+    monkeypatch.setattr(rate_limit, "trusted_proxies", rate_limit.parse_networks("10.0.0.0/8, 192.168.1.1"))
+
+
+def test_client_ip_ignores_forwarded_for_from_untrusted_peers():
+    assert rate_limit.client_ip(request("8.8.8.8", "1.1.1.1")) == "8.8.8.8"
+
+
+def test_client_ip_takes_the_last_untrusted_hop(trusted_proxies):
+    # The left-most entries are whatever the client chose to send
+    assert rate_limit.client_ip(request("10.0.0.5", "6.6.6.6, 1.2.3.4, 10.1.1.1")) == "1.2.3.4"
+    assert rate_limit.client_ip(request("10.0.0.5")) == "10.0.0.5"
+    assert rate_limit.client_ip(request("8.8.8.8", "1.1.1.1")) == "8.8.8.8"
+
+
+def test_reset_password_is_throttled_per_token(client):
+    payload = {"token": "123456", "password": "new-password"}
+    limit = settings.RATE_LIMIT_RESET_TOKEN_PER_TOKEN
+
+    codes = [client.post("/api/v1/users/reset-password", json=payload).status_code for _ in range(limit + 1)]
+
+    assert 429 not in codes[:limit]
+    assert codes[limit] == 429
+
+
+def test_reset_password_is_throttled_per_ip(client):
+    limit = settings.RATE_LIMIT_RESET_TOKEN_PER_IP
+
+    codes = [
+        client.post("/api/v1/users/reset-password", json={"token": str(100000 + i), "password": "new-password"}).status_code
+        for i in range(limit + 1)
+    ]
+
+    assert 429 not in codes[:limit]
+    assert codes[limit] == 429
@@ -0,0 +1,49 @@
+import time
+
+from ms_fa.helpers.revocation import REVOKED_SESSIONS_KEY, RevocationList
+from ms_fa.helpers.time import epoch_now
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def test_listener_loads_existing_and_live_revocations(cache, redis):
+    redis.zadd(REVOKED_SESSIONS_KEY, {"before-start": epoch_now() + 100})
+    revoked = RevocationList()
+    revoked.start(cache)
+    try:
+        assert wait_for(lambda: revoked.is_revoked("before-start"))
+
+        RevocationList().revoke(cache, "while-running", epoch_now() + 100)
+
+        assert wait_for(lambda: revoked.is_revoked("while-running"))
+    finally:
+        revoked.stop()
+
+
+def test_expired_revocations_are_ignored(cache, redis):
+    redis.zadd(REVOKED_SESSIONS_KEY, {"expired": epoch_now() - 1})
+    revoked = RevocationList()
+    revoked.start(cache)
+    try:
+        time.sleep(0.3)
+        assert not revoked.is_revoked("expired")
+    finally:
+        revoked.stop()
+
+
+def test_logout_revokes_the_token(client, login):
+    token = login("shopper@example.com")["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.post("/api/v1/users/logout", headers=headers).status_code == 204
+
+    response = client.post("/api/v1/users/check", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has been revoked"
@@ -0,0 +1,55 @@
+from ms_fa.models import Permission, Role
+from ms_fa.repositories import RoleRepository, UserRepository
+
+
+def test_role_permission_change_refreshes_member_snapshots(cache, db):
+    role = RoleRepository(db, cache).add({"name": "auditor", "fixed": False})
+    user = UserRepository(db, cache).add({
+        "email": "auditor@example.com",
+        "phone": "5500000001",
+        "name": "Audit",
+        "lastname": "Or",
+        "password": "secret",
+        "role_id": role.id,
+    })
+    user_repo = UserRepository(db, cache)
+    user_repo.setCache(user, force=True)
+    key = user_repo.cache_key(user.id)
+    permission = db.query(Permission).filter_by(name="User - Permission - list").first()
+    assert permission.name not in cache.get_hash(key)["permissions"]
+
+    RoleRepository(db, cache).sync_permissions(role.id, [permission.id])
+
+    assert permission.name in cache.get_hash(key)["permissions"]
+
+
+def test_role_delete_refreshes_members_and_drops_the_index(cache, db):
+    role_repo = RoleRepository(db, cache)
+    role = role_repo.add({"name": "temporary", "fixed": False})
+    user = UserRepository(db, cache).add({
+        "email": "temporary@example.com",
+        "phone": "5500000002",
+        "name": "Temp",
+        "lastname": "Orary",
+        "password": "secret",
+        "role_id": role.id,
+    })
+    user_repo = UserRepository(db, cache)
+    user_repo.setCache(user, force=True)
+    key = user_repo.cache_key(user.id)
+
+    _, deleted = role_repo.delete(role.id)
+
+    assert deleted
+    assert "temporary" not in cache.get_hash(key)["roles"]
+    assert not cache.exists(role_repo.members_key(role.id))
+
+
+def test_root_role_cannot_be_renamed(cache, db):
+    root = db.query(Role).filter_by(name="root").first()
+
+    _, updated = RoleRepository(db, cache).update(root.id, {"name": "admin"})
+
+    db.refresh(root)
+    assert not updated
+    assert root.name == "root"
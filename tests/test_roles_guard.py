@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import delete
+
+from ms_fa.helpers.authz import authz
+from ms_fa.models import Role
+from ms_fa.models.association_tables import user_role_table
+from ms_fa.repositories import UserRepository
+
+
+@pytest.fixture
+def operator(db, cache):
+    root = db.query(Role).filter_by(name="root").first()
+    user = UserRepository(db, cache).add({
+        "email": "operator@example.com",
+        "phone": "5500000004",
+        "name": "Oper",
+        "lastname": "Ator",
+        "password": "secret",
+        "role_id": root.id,
+    })
+    yield user, root
+    UserRepository(db).delete(user.id)
+
+
+def list_routes(client, token: str):
+    return client.get("/api/v1/users/admin/permissions/routes", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_removed_role_is_not_honoured_from_a_stale_snapshot(client, db, cache, login, operator):
+    user, root = operator
+    token = login("operator@example.com")["token"]
+    assert list_routes(client, token).status_code == 200
+
+    # Role removed without refreshing the cached snapshot, as before the member refresh runs
+    db.execute(delete(user_role_table).where(
+        user_role_table.c.user_id == user.id, user_role_table.c.role_id == root.id
+    ))
+    db.commit()
+    authz.bump(cache)
+
+    assert list_routes(client, token).status_code == 403
+
+
+def test_current_token_roles_are_trusted(client, login):
+    assert list_routes(client, login("shopper@example.com")["token"]).status_code == 403
+    assert list_routes(client, login()["token"]).status_code == 200
@@ -0,0 +1,46 @@
+def test_route_table_covers_protected_routes(client, login):
+    token = login()["token"]
+
+    response = client.get("/api/v1/users/admin/permissions/routes", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert any(route["name"] == "generate_token" for route in response.json())
+
+
+def test_missing_permission_is_denied(client, login):
+    token = login("shopper@example.com")["token"]
+
+    response = client.get("/api/v1/users/admin/permissions/list", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 403
+    assert response.json()["detail"] == "You don't have permission to access this resource"
+
+
+def test_missing_role_is_denied(client, login):
+    token = login("shopper@example.com")["token"]
+
+    response = client.get("/api/v1/users/admin/permissions/routes", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 403
+    assert response.json()["detail"] == "You don't have the required role to access this resource"
+
+
+def test_invalid_token_is_unauthorized(client):
+    response = client.get("/api/v1/users/admin/permissions/list", headers={"Authorization": "Bearer junk"})
+
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
+
+
+def test_root_is_allowed(client, login):
+    token = login()["token"]
+
+    response = client.get("/api/v1/users/admin/permissions/list", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+
+
+def test_unprotected_route_passes_through(client, login):
+    token = login("shopper@example.com")["token"]
+
+    assert client.get("/api/v1/users/profile", headers={"Authorization": f"Bearer {token}"}).status_code == 200
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from ms_fa.db.serializers import HEADER, MAGIC, SERIALIZERS, EnvelopeCodec
+
+
+VALUE = {"id": "someone", "roles": ["root"], "azv": 3}
+
+
+@pytest.mark.parametrize("name", list(SERIALIZERS))
+def test_binary_entries_carry_the_header(name):
+    codec = EnvelopeCodec(name)
+
+    raw = codec.encode("key", VALUE, 60, 1700000000)
+
+    assert raw[0] == MAGIC
+    assert HEADER.unpack_from(raw)[2] == SERIALIZERS[name].id
+    assert codec.decode("key", raw) == {"data": VALUE, "key": "key", "created_at": 1700000000, "exp": 60}
+
+
+def test_legacy_entries_are_plain_json():
+    raw = EnvelopeCodec("legacy").encode("key", VALUE, None, 1700000000)
+
+    assert json.loads(raw) == {"data": VALUE, "key": "key", "created_at": 1700000000, "exp": None}
+
+
+@pytest.mark.parametrize("name", ["legacy", *SERIALIZERS])
+def test_every_codec_reads_both_formats(name):
+    codec = EnvelopeCodec(name)
+    legacy = EnvelopeCodec("legacy").encode("key", VALUE, None, 1).encode()
+    binary = EnvelopeCodec("msgpack").encode("key", VALUE, None, 1)
+
+    assert codec.decode("key", legacy)["data"] == VALUE
+    assert codec.decode("key", binary)["data"] == VALUE
+
+
+def test_unknown_serializer_id_reads_as_missing():
+    raw = HEADER.pack(MAGIC, 1, 99, 1, 0) + b"payload"
+
+    assert EnvelopeCodec("json").decode("key", raw) is None
+
+
+def test_unknown_serializer_name_is_rejected():
+    with pytest.raises(ValueError):
+        EnvelopeCodec("pickle")
@@ -0,0 +1,88 @@
+import datetime
+
+from ms_fa.helpers.revocation import revocations
+from ms_fa.models import Session, User
+from ms_fa.repositories import SessionRepository
+
+
+def refresh(client, refresh_token: str):
+    return client.post("/api/v1/users/refresh", headers={"Authorization": f"Bearer {refresh_token}"})
+
+
+def test_refresh_rotates_the_session(client, login):
+    tokens = login()
+
+    response = refresh(client, tokens["refresh_token"])
+
+    assert response.status_code == 200
+    assert response.json()["refresh_token"] != tokens["refresh_token"]
+    check = client.post("/api/v1/users/check", headers={"Authorization": f"Bearer {response.json()['token']}"})
+    assert check.status_code == 204
+
+
+def test_refresh_retry_within_grace_is_rejected_without_revoking(client, login):
+    tokens = login()
+    rotated = refresh(client, tokens["refresh_token"]).json()
+
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    assert refresh(client, rotated["refresh_token"]).status_code == 200
+
+
+def test_reused_refresh_token_revokes_the_family(client, login, monkeypatch):
+    from ms_fa.config import settings
+
+    monkeypatch.setattr(settings, "SESSION_REUSE_GRACE", -1)
+    tokens = login()
+    rotated = refresh(client, tokens["refresh_token"]).json()
+
+    reused = refresh(client, tokens["refresh_token"])
+
+    assert reused.status_code == 401
+    assert refresh(client, rotated["refresh_token"]).status_code == 401
+
+
+def test_concurrent_rotation_has_one_winner(client, cache, login):
+    from ms_fa.db import SessionLocal
+
+    login()
+    first_db, second_db = SessionLocal(), SessionLocal()
+    try:
+        session = first_db.query(Session).order_by(Session.created_at.desc()).first()
+        stale = second_db.query(Session).filter_by(id=session.id).first()
+        expires = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+
+        winner = SessionRepository(first_db, cache).rotate(session, "rotated-first", expires)
+        assert winner is not None and winner.token == "rotated-first"
+
+        # The loser presented a token that was already rotated away
+        assert SessionRepository(second_db, cache).rotate(stale, "rotated-second", expires) is None
+        assert revocations.is_revoked("rotated-first")
+    finally:
+        first_db.close()
+        second_db.close()
+
+
+def test_pruned_sessions_are_revoked_only_after_commit(cache, db, monkeypatch):
+    from ms_fa.config import settings
+
+    user = db.query(User).filter_by(email="merchant_root@example.com").first()
+    repo = SessionRepository(db, cache)
+    expires = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    repo.open(user.id, "prune-a", expires)
+    monkeypatch.setattr(settings, "SESSION_MAX_PER_USER", 1)
+
+    commit = db.commit
+
+    def failing_commit():
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(db, "commit", failing_commit)
+    try:
+        repo.open(user.id, "prune-b", expires)
+    except RuntimeError:
+        db.rollback()
+    assert not revocations.is_revoked("prune-a")
+
+    monkeypatch.setattr(db, "commit", commit)
+    repo.open(user.id, "prune-c", expires)
+    assert revocations.is_revoked("prune-a")
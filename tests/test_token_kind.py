@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import event
+
+from ms_fa.db import async_engine, engine
+from ms_fa.db.cache import local_cache
+from ms_fa.models import App
+
+
+@pytest.fixture
+def statements():
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, "before_cursor_execute", record)
+    yield executed
+    for target in (engine, async_engine.sync_engine):
+        event.remove(target, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def app_token(client, db, login):
+    app = db.query(App).first()
+    token = login()["token"]
+    response = client.post(f"/api/v1/users/admin/apps/{app.id}/token", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.text
+    return app.id, response.json()["token"]
+
+
+def touches_user_table(statement: str) -> bool:
+    return "FROM user" in statement or 'FROM "user"' in statement
+
+
+def test_app_token_skips_the_user_lookup(client, redis, app_token, statements):
+    app_id, token = app_token
+    redis.flushall()
+    local_cache.reset()
+    statements.clear()
+
+    response = client.post("/api/v1/users/check", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 204
+    assert statements, "the snapshot should have been rebuilt from the database"
+    assert not any(touches_user_table(statement) for statement in statements)
+
+
+def test_user_token_skips_the_app_lookup(client, redis, login, statements):
+    token = login("shopper@example.com")["token"]
+    redis.flushall()
+    local_cache.reset()
+    statements.clear()
+
+    response = client.post("/api/v1/users/check", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 204
+    assert not any("FROM app" in statement for statement in statements)